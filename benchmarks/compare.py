@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def error_rate(result: Dict[str, Any]) -> float:
+    return result.get('errors', 0) / result['requests'] if result.get('requests') else 0.0
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            error_threshold: float = 0.01) -> List[str]:
+    """Список регрессий: пропускная способность ниже, а p95 или время микротеста выше порога относительно базы.
+
+    Замер, доля ошибок которого изменилась больше чем на error_threshold, тоже попадает в список:
+    его rps и задержки мерили другой путь обработки (например, ответы 409 вместо записи).
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if 'requests' in result and abs(error_rate(result) - error_rate(before)) > error_threshold:
+            regressions.append(f"{name}: доля ошибок {error_rate(before):.1%} -> {error_rate(result):.1%}")
+        if 'rps' in result:
+            if before['rps'] and result['rps'] < before['rps'] * (1 - threshold):
+                regressions.append(f"{name}: rps {before['rps']:.1f} -> {result['rps']:.1f}")
+            if before['p95_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms")
+        elif before.get('best_us') and result['best_us'] > before['best_us'] * (1 + threshold):
+            regressions.append(f"{name}: {before['best_us']:.2f} us -> {result['best_us']:.2f} us")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Сравнение двух прогонов бенчмарков')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.10, help='допустимое ухудшение, доля (0.10 = 10%%)')
+    args = parser.parse_args()
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for line in regressions:
+        print(f'РЕГРЕССИЯ {line}')
+    if not regressions:
+        print('Регрессий не найдено')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
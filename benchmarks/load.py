@@ -0,0 +1,75 @@
+import http.client
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+Request = Tuple[str, str, Optional[bytes]]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def run_load(host: str, port: int, make_request: Callable[[int], Request], concurrency: int,
+             duration: float, warmup: float = 0.5) -> Dict[str, float]:
+    """Гоняет make_request из concurrency потоков duration секунд; соединение переиспользуется, если сервер позволяет."""
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(index: int) -> None:
+        conn = None
+        sequence = index
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            method, path, body = make_request(sequence)
+            sequence += concurrency
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection(host, port, timeout=10)
+                request_started = time.perf_counter()
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - request_started
+                if response.will_close:
+                    conn.close()
+                    conn = None
+                if request_started < measure_from:
+                    continue
+                if response.status >= 400:
+                    errors[index] += 1
+                latencies[index].append(elapsed)
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = sorted(latency for per_thread in latencies for latency in per_thread)
+    return {
+        'concurrency': concurrency,
+        'requests': len(merged),
+        'errors': sum(errors),
+        'rps': len(merged) / duration,
+        'p50_ms': percentile(merged, 0.50) * 1000,
+        'p95_ms': percentile(merged, 0.95) * 1000,
+        'p99_ms': percentile(merged, 0.99) * 1000,
+    }
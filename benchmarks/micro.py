@@ -0,0 +1,70 @@
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src.backend.dao.exchange_rate_dao import ExchangeRateDAO
+from src.backend.db.init_db import ConnectionPool
+from src.backend.services.currency_registry import CurrencyRegistry
+from src.backend.services.money import money
+
+
+def measure(func: Callable[[], object], number: int, repeat: int = 5) -> Dict[str, float]:
+    """Время одного вызова в микросекундах: минимум и медиана по repeat сериям из number вызовов."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {'number': number, 'best_us': min(samples), 'median_us': statistics.median(samples)}
+
+
+def run_micro(db_path: str, codes: List[str], number: int = 2000) -> Dict[str, Dict[str, float]]:
+    pool = ConnectionPool(db_path)
+    exchange_repo = ExchangeRateDAO(pool, CurrencyRegistry(pool))
+    pairs: List[Tuple[str, str]] = [(codes[(i * 7919) % len(codes)], codes[(i * 104729 + 1) % len(codes)])
+                                    for i in range(number)]
+    results = {}
+
+    exchange_repo.get_rate_graph()
+    position = iter(range(10 ** 12))
+
+    def convert():
+        from_code, to_code = pairs[next(position) % number]
+        exchange_repo.calculate_exchange(from_code, to_code, 100.0)
+    results['calculate_exchange'] = measure(convert, number)
+
+    # Точный режим: тот же путь на Decimal с суммой строкой, как она приходит из запроса
+    money.configure(exact=True)
+    try:
+        exchange_repo.invalidate_rate_graph()
+        exchange_repo.get_rate_graph()
+
+        def convert_exact():
+            from_code, to_code = pairs[next(position) % number]
+            exchange_repo.calculate_exchange(from_code, to_code, '100.00')
+        results['calculate_exchange_exact'] = measure(convert_exact, number)
+    finally:
+        money.configure()
+        exchange_repo.invalidate_rate_graph()
+        exchange_repo.get_rate_graph()
+
+    def rebuild_graph():
+        exchange_repo.invalidate_rate_graph()
+        exchange_repo.get_rate_graph()
+    results['rate_graph_rebuild'] = measure(rebuild_graph, max(1, number // 100))
+
+    # Матрица кросс-курсов всех валют по уже построенному графу: один обход и внешнее деление
+    exchange_repo.get_rate_graph()
+    results['rate_matrix_full'] = measure(lambda: exchange_repo.get_rate_matrix(None, codes[0]), max(1, number // 200))
+
+    cursor = pool.reader().cursor()
+    cursor.execute('SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates')
+    rows = cursor.fetchall()
+    results['row_to_dict_per_row'] = measure(
+        lambda: [exchange_repo._row_to_exchange_rate(row) for row in rows], max(1, number // 100))
+    for key in ('best_us', 'median_us'):
+        results['row_to_dict_per_row'][key] /= max(1, len(rows))
+
+    results['get_all_exchange_rates'] = measure(exchange_repo.get_all_exchange_rates, max(1, number // 100))
+    return results
@@ -0,0 +1,222 @@
+"""Нагрузочные и микро-бенчмарки API.
+
+    python -m benchmarks.run --datasets 10:10,1000:1000 --concurrency 1,8,64 --duration 3
+    python -m benchmarks.run --compare benchmarks/results/<прошлый прогон>.json
+
+Для каждого набора данных (валюты:пары) создаётся свежая БД во временном каталоге,
+сервер запускается отдельным процессом, и каждый эндпоинт нагружается локальным генератором.
+Результаты сохраняются в JSON; с --compare регрессии печатаются и дают код выхода 1.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Set, Tuple
+
+from benchmarks.compare import compare
+from benchmarks.load import Request, run_load
+from benchmarks.micro import run_micro
+from benchmarks.seed import currency_codes, seed_database
+from benchmarks.writes import run_writes
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_FILE = 'exchange_rates.db'
+
+
+# Валюты без курсов, заводимые перед замером POST /exchangeRates: из них набираются свежие пары для вставок
+SPARE_CURRENCIES = 300
+MAX_NEW_PAIRS = 200000
+
+
+def build_scenarios(codes: List[str], seeded: Set[Tuple[str, str]]
+                    ) -> Tuple[Dict[str, Callable[[int], Request]], Dict[str, List[Request]]]:
+    """Генераторы запросов по эндпоинтам и подготовительные запросы к ним (вне замера).
+
+    Запись идёт последней, чтобы не влиять на замеры чтения. Каждая вставка курса получает
+    ещё не существующую пару: иначе замер мерил бы ответы 409 вместо записи.
+    """
+    pairs = sorted(seeded)
+    star = [code for code in codes[1:] if ('USD', code) in seeded] or codes
+    free_codes = [code for code in currency_codes(26 ** 3) if code not in set(codes)]
+    spare_codes, free_codes = free_codes[:SPARE_CURRENCIES], free_codes[SPARE_CURRENCIES:]
+    universe = codes + spare_codes
+    free_pairs = list(itertools.islice(
+        ((base, target) for base in universe for target in universe
+         if base != target and (base, target) not in seeded and (target, base) not in seeded), MAX_NEW_PAIRS))
+
+    # Уникальные значения для вставок продолжаются между замерами, а не начинаются заново
+    new_pair_numbers, new_code_numbers = itertools.count(), itertools.count()
+
+    def pick(items, sequence):
+        return items[(sequence * 7919) % len(items)]
+
+    def post_exchange_rate(_):
+        # За пределами free_pairs пары повторяются; такие 409 видны в errors и в compare()
+        base, target = free_pairs[next(new_pair_numbers) % len(free_pairs)]
+        body = urllib.parse.urlencode({'baseCurrencyCode': base, 'targetCurrencyCode': target, 'rate': 1.5})
+        return 'POST', '/exchangeRates', body.encode()
+
+    def post_currency(_):
+        code = free_codes[next(new_code_numbers) % len(free_codes)]
+        return 'POST', '/currencies', urllib.parse.urlencode({'name': 'Bench', 'code': code, 'sign': 'b'}).encode()
+
+    scenarios = {
+        'GET /currencies': lambda n: ('GET', '/currencies', None),
+        'GET /exchangeRates': lambda n: ('GET', '/exchangeRates', None),
+        'GET /exchangeRate/{PAIR}': lambda n: ('GET', '/exchangeRate/%s%s' % pick(pairs, n), None),
+        'GET /exchange': lambda n: ('GET', '/exchange?' + urllib.parse.urlencode(
+            {'from': pick(star, n), 'to': pick(star, n + 1), 'amount': n % 1000 + 1}), None),
+        'PATCH /exchangeRate/{PAIR}': lambda n: ('PATCH', '/exchangeRate/%s%s' % pick(pairs, n),
+                                                 b'rate=%d.%06d' % (n % 100 + 1, n % 1000000)),
+    }
+    setup = {}
+    if free_pairs:
+        scenarios['POST /exchangeRates'] = post_exchange_rate
+        setup['POST /exchangeRates'] = [
+            ('POST', '/currencies', urllib.parse.urlencode({'name': 'Spare', 'code': code, 'sign': 's'}).encode())
+            for code in spare_codes]
+    if free_codes:
+        scenarios['POST /currencies'] = post_currency
+    return scenarios, setup
+
+
+def send_requests(port: int, requests: List[Request]) -> None:
+    conn = http.client.HTTPConnection('localhost', port, timeout=10)
+    try:
+        for method, path, body in requests:
+            conn.request(method, path, body=body, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                raise RuntimeError(f'Подготовка замера: {method} {path} -> {response.status}')
+            if response.will_close:
+                conn.close()
+    finally:
+        conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir: str, port: int, server_args: List[str]) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    process = subprocess.Popen([sys.executable, '-m', 'src.backend.main', '--port', str(port)] + server_args,
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=0.2).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError('Сервер завершился при запуске')
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('Сервер не начал принимать соединения')
+
+
+def parse_datasets(value: str) -> List[Tuple[int, int]]:
+    datasets = []
+    for item in value.split(','):
+        currencies, _, pairs = item.partition(':')
+        datasets.append((int(currencies), int(pairs or currencies)))
+    return datasets
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарки API обмена валют')
+    parser.add_argument('--datasets', default='10:10,1000:1000', help='наборы валюты:пары через запятую')
+    parser.add_argument('--concurrency', default='1,8,64', help='число одновременных клиентов через запятую')
+    parser.add_argument('--duration', type=float, default=3.0, help='секунд нагрузки на каждый замер')
+    parser.add_argument('--scenarios', default='', help='подстроки имён сценариев через запятую (по умолчанию все)')
+    parser.add_argument('--server-args', default='--workers 16', help='аргументы для src.backend.main')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-writes', action='store_true', help='без замера записи: commit на запрос против группового')
+    parser.add_argument('--output', default=None, help='файл результатов JSON')
+    parser.add_argument('--compare', default=None, help='прошлый файл результатов для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    scenario_filter = [name for name in args.scenarios.split(',') if name]
+    results = {}
+    for currencies, pairs in parse_datasets(args.datasets):
+        dataset = f'{currencies}x{pairs}'
+        with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+            db_path = os.path.join(workdir, DB_FILE)
+            codes, seeded = seed_database(db_path, currencies, pairs)
+            print(f'[{dataset}] засеяно: {len(codes)} валют, {len(seeded)} пар')
+
+            if not args.skip_micro:
+                for name, result in run_micro(db_path, codes).items():
+                    results[f'{dataset}/micro/{name}'] = result
+                    print(f"[{dataset}] micro {name}: {result['best_us']:.2f} us")
+
+            if not args.skip_writes:
+                for name, result in run_writes(db_path, seeded, duration=args.duration).items():
+                    results[f'{dataset}/writes/{name}'] = result
+                    print(f"[{dataset}] writes {name}: {result['rps']:.0f} записей/с, "
+                          f"p50 {result['p50_ms']:.2f} / p99 {result['p99_ms']:.2f} ms, ошибок {result['errors']}")
+
+            if not args.skip_load:
+                port = free_port()
+                server = start_server(workdir, port, args.server_args.split())
+                try:
+                    scenarios, setup = build_scenarios(codes, seeded)
+                    for name, make_request in scenarios.items():
+                        if scenario_filter and not any(part in name for part in scenario_filter):
+                            continue
+                        send_requests(port, setup.get(name, []))
+                        for level in concurrency_levels:
+                            result = run_load('localhost', port, make_request, level, args.duration)
+                            results[f'{dataset}/{name}/c{level}'] = result
+                            print(f"[{dataset}] {name} c={level}: {result['rps']:.0f} rps, "
+                                  f"p50 {result['p50_ms']:.2f} / p95 {result['p95_ms']:.2f} / p99 {result['p99_ms']:.2f} ms, "
+                                  f"ошибок {result['errors']}")
+                finally:
+                    server.terminate()
+                    server.wait(timeout=10)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(REPO_ROOT, 'benchmarks', 'results', time.strftime('run-%Y%m%d-%H%M%S.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for line in regressions:
+            print(f'РЕГРЕССИЯ {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
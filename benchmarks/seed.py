@@ -0,0 +1,46 @@
+import itertools
+import random
+import sqlite3
+from typing import List, Set, Tuple
+
+from src.backend.db.init_db import ConnectionPool, DatabaseInitializer
+
+
+def currency_codes(count: int) -> List[str]:
+    """USD и далее AAA, AAB, ... - всего count трёхбуквенных кодов (не больше 26^3)."""
+    codes = ['USD']
+    for letters in itertools.product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3):
+        if len(codes) >= count:
+            break
+        code = ''.join(letters)
+        if code != 'USD':
+            codes.append(code)
+    return codes[:count]
+
+
+def seed_database(db_path: str, currencies: int, pairs: int, seed: int = 42) -> Tuple[List[str], Set[Tuple[str, str]]]:
+    """Создаёт схему и заполняет БД: курсы USD -> X для всех валют плюс случайные пары до общего числа pairs."""
+    random.seed(seed)
+    DatabaseInitializer(ConnectionPool(db_path)).migrate()
+    codes = currency_codes(currencies)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany('INSERT OR IGNORE INTO Currencies (FullName, Code, Sign) VALUES (?, ?, ?)',
+                         [(f'Currency {code}', code, code[0]) for code in codes])
+        ids = dict(conn.execute('SELECT Code, ID FROM Currencies'))
+        seeded = [('USD', code) for code in codes[1:pairs + 1]]
+        seeded_set = set(seeded)
+        attempts = 0
+        while len(seeded) < pairs and len(codes) > 1 and attempts < pairs * 10:
+            attempts += 1
+            pair = tuple(random.sample(codes, 2))
+            if pair not in seeded_set and (pair[1], pair[0]) not in seeded_set:
+                seeded.append(pair)
+                seeded_set.add(pair)
+        rates = [(ids[base], ids[target], round(random.uniform(0.01, 150), 6)) for base, target in seeded]
+        conn.executemany('INSERT OR IGNORE INTO ExchangeRates (BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal) VALUES (?, ?, ?, ?)',
+                         [(base, target, rate, repr(rate)) for base, target, rate in rates])
+        conn.commit()
+    finally:
+        conn.close()
+    return codes, seeded_set
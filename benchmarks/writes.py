@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+from src.backend.dao.exchange_rate_dao import ExchangeRateDAO
+from src.backend.db.init_db import ConnectionPool
+from src.backend.services.currency_registry import CurrencyRegistry
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def sustained_writes(exchange_repo: ExchangeRateDAO, pairs: List[str], threads: int, duration: float) -> Dict[str, float]:
+    """threads потоков без пауз обновляют курсы в течение duration секунд, как обработчики PATCH."""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(offset: int):
+        local, failed, n = [], 0, offset
+        while time.monotonic() < deadline:
+            n += threads
+            started = time.perf_counter()
+            try:
+                exchange_repo.update_exchange_rate(pairs[n % len(pairs)], 1 + n % 1000 / 1000)
+            except Exception:
+                failed += 1
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {'requests': len(latencies), 'errors': errors[0], 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.5), 'p95_ms': percentile(latencies, 0.95), 'p99_ms': percentile(latencies, 0.99)}
+
+
+def run_writes(db_path: str, seeded: Set[Tuple[str, str]], threads: int = 16,
+               duration: float = 2.0) -> Dict[str, Dict[str, float]]:
+    """Пропускная способность записи курсов: commit на каждый запрос против группового commit.
+
+    Каждый режим меряется при synchronous=NORMAL (как у сервера) и FULL (fsync на каждый commit).
+    """
+    pairs = [base + target for base, target in sorted(seeded)]
+    results = {}
+    for synchronous in ('NORMAL', 'FULL'):
+        for mode in ('commit_per_request', 'group_commit'):
+            pool = ConnectionPool(db_path)
+            with pool.writer() as conn:
+                conn.execute(f'PRAGMA synchronous={synchronous}')
+            exchange_repo = ExchangeRateDAO(pool, CurrencyRegistry(pool))
+            if mode == 'group_commit':
+                exchange_repo.enable_group_commit()
+            results[f'{mode}_sync_{synchronous.lower()}'] = sustained_writes(exchange_repo, pairs, threads, duration)
+            pool.close()
+    return results
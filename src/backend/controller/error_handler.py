@@ -1,6 +1,12 @@
 import json
+import logging
 import sqlite3
 
+from src.backend.routing.response import ERROR_HEADERS
+from src.backend.services.admission import Rejected
+
+
+logger = logging.getLogger(__name__)
 
 class ErrorHandler:
     @staticmethod
@@ -8,28 +14,22 @@ class ErrorHandler:
         def wrapper(self, *args, **kwargs):
             try:
                 return func(self, *args, **kwargs)
+            except Rejected as e:
+                logger.info('%s %s -> %s', self.command, self.path, e)
+                self.write_response(e.status, ERROR_HEADERS, json.dumps({"message": str(e)}).encode('utf-8'),
+                                    (('Retry-After', str(e.retry_after)),))
             except ValueError as e:
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"message": str(e)}).encode('utf-8'))
+                logger.info('%s %s -> %s', self.command, self.path, e)
+                self.write_response(400, ERROR_HEADERS, json.dumps({"message": str(e)}).encode('utf-8'))
             except KeyError as e:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"message": str(e)}).encode('utf-8'))
+                logger.info('%s %s -> %s', self.command, self.path, e)
+                self.write_response(404, ERROR_HEADERS, json.dumps({"message": str(e)}).encode('utf-8'))
             except sqlite3.IntegrityError as e:
-                self.send_response(409)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"message": str(e)}).encode('utf-8'))
+                logger.info('%s %s -> %s', self.command, self.path, e)
+                self.write_response(409, ERROR_HEADERS, json.dumps({"message": str(e)}).encode('utf-8'))
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"message": "Внутренняя ошибка сервера"}).encode('utf-8'))
+                logger.exception('Внутренняя ошибка при обработке %s %s', self.command, self.path)
+                # После непредвиденной ошибки состояние соединения неизвестно: не переиспользуем его
+                self.close_connection = True
+                self.write_response(500, ERROR_HEADERS, json.dumps({"message": "Внутренняя ошибка сервера"}).encode('utf-8'))
         return wrapper
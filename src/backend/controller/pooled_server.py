@@ -0,0 +1,232 @@
+import json
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+from src.backend.routing.response import build_head, ERROR_HEADERS
+from src.backend.services.metrics import metrics
+
+
+OVERLOADED_BODY = json.dumps({"message": "Сервер перегружен, повторите позже"}).encode('utf-8')
+
+
+class DetachableHTTPServer(HTTPServer):
+    """HTTPServer, у которого обработчик может забрать сокет себе (например, для SSE) - сервер его не закроет."""
+
+    # Однопоточный сервер закрывает соединение после ответа: простаивающий keep-alive клиент занял бы его целиком
+    keep_alive = False
+
+    def __init__(self, server_address, handler_class, bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+
+    @classmethod
+    def from_socket(cls, sock, handler_class, **kwargs):
+        """Сервер поверх уже слушающего сокета, например унаследованного от родительского процесса."""
+        server = cls(sock.getsockname()[:2], handler_class, bind_and_activate=False, **kwargs)
+        server.socket.close()
+        server.socket = sock
+        server.server_address = sock.getsockname()
+        server.server_name, server.server_port = server.server_address[:2]
+        return server
+
+    def detach_request(self, request):
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def shutdown_request(self, request):
+        with self._detached_lock:
+            if request in self._detached:
+                self._detached.discard(request)
+                return
+        super().shutdown_request(request)
+
+
+class PooledHTTPServer(DetachableHTTPServer):
+    """HTTPServer, обрабатывающий запросы в пуле из фиксированного числа потоков.
+
+    Соединения HTTP/1.1 держатся открытыми между запросами, но не занимают поток пула:
+    после ответа обработчик паркуется в селекторе и возвращается в пул, когда клиент пришлёт
+    следующий запрос. Простаивающие дольше keep_alive_timeout секунд соединения закрываются.
+
+    Очередь пула ограничена max_queue запросами: сверх неё новое соединение или пришедший
+    запрос keep-alive сразу получает 503 с Retry-After вместо ожидания в очереди без конца.
+    Запрос, прождавший в очереди дольше max_queue_wait секунд, тоже получает 503: клиент,
+    скорее всего, уже не ждёт ответа, и поток лучше отдать следующему.
+    """
+
+    request_queue_size = 128
+    keep_alive = True
+    keep_alive_timeout = 15
+    max_queue = 128
+    max_queue_wait = None
+    retry_after = 1
+
+    def __init__(self, server_address, handler_class, workers: int = 8, bind_and_activate=True,
+                 max_queue=None, max_queue_wait=None):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.workers = workers
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if max_queue_wait is not None:
+            self.max_queue_wait = max_queue_wait
+        self._queued = 0
+        self._queue_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+        self._parked = {}
+        self._to_register = []
+        self._parked_lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._closing = False
+        self._parking_thread = threading.Thread(target=self._run_parking, name='http-keep-alive', daemon=True)
+        self._parking_thread.start()
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def process_request(self, request, client_address):
+        if not self._enqueue():
+            self.reject_request(request, 'queue_full')
+            return
+        self.executor.submit(self.process_request_thread, request, client_address, time.monotonic())
+
+    def process_request_thread(self, request, client_address, enqueued):
+        if not self._dequeue(enqueued):
+            self.reject_request(request, 'queue_timeout')
+            return
+        handler = None
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        self._release(request, handler)
+
+    def resume_request_thread(self, handler, enqueued):
+        if not self._dequeue(enqueued):
+            self._reject_parked(handler, 'queue_timeout')
+            return
+        try:
+            handler.resume()
+        except Exception:
+            handler.keep_alive_pending = False
+            self.handle_error(handler.request, handler.client_address)
+        self._release(handler.request, handler)
+
+    def _enqueue(self):
+        with self._queue_lock:
+            if self._queued >= self.max_queue:
+                return False
+            self._queued += 1
+            return True
+
+    def _dequeue(self, enqueued):
+        """Запрос взят потоком из очереди; False, если он прождал дольше max_queue_wait."""
+        with self._queue_lock:
+            self._queued -= 1
+        waited = time.monotonic() - enqueued
+        metrics.observe_queue_wait(waited)
+        return self.max_queue_wait is None or waited <= self.max_queue_wait
+
+    def reject_request(self, request, reason):
+        """503 с Retry-After прямо в сокет, без разбора запроса, и закрытие соединения."""
+        metrics.count_rejection(reason)
+        head = build_head(503, b'', ERROR_HEADERS, (('Retry-After', str(self.retry_after)),),
+                          close=True, length=len(OVERLOADED_BODY))
+        try:
+            request.settimeout(1)
+            request.sendall(head + OVERLOADED_BODY)
+            # Непрочитанный запрос в буфере превратил бы закрытие в RST, и клиент мог бы не увидеть ответ
+            request.setblocking(False)
+            while request.recv(65536):
+                pass
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _reject_parked(self, handler, reason):
+        handler.keep_alive_pending = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.reject_request(handler.request, reason)
+
+    def _release(self, request, handler):
+        if handler is not None and handler.keep_alive_pending and not self._closing:
+            self._park(handler)
+        else:
+            self.shutdown_request(request)
+
+    def _park(self, handler):
+        with self._parked_lock:
+            self._parked[handler.request] = (handler, time.monotonic())
+            self._to_register.append(handler.request)
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run_parking(self):
+        last_sweep = time.monotonic()
+        while not self._closing:
+            for key, _ in self._selector.select(timeout=1):
+                if key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                sock = key.fileobj
+                self._selector.unregister(sock)
+                with self._parked_lock:
+                    handler, _ = self._parked.pop(sock, (None, None))
+                if handler is None:
+                    continue
+                if self._enqueue():
+                    self.executor.submit(self.resume_request_thread, handler, time.monotonic())
+                else:
+                    self._reject_parked(handler, 'queue_full')
+
+            with self._parked_lock:
+                to_register, self._to_register = self._to_register, []
+            for sock in to_register:
+                self._selector.register(sock, selectors.EVENT_READ)
+
+            now = time.monotonic()
+            if now - last_sweep < 1:
+                continue
+            last_sweep = now
+            with self._parked_lock:
+                expired = [handler for handler, parked_at in self._parked.values()
+                           if now - parked_at > self.keep_alive_timeout]
+                for handler in expired:
+                    del self._parked[handler.request]
+            for handler in expired:
+                self._selector.unregister(handler.request)
+                self._close_parked(handler)
+
+    def _close_parked(self, handler):
+        handler.keep_alive_pending = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        self.executor.shutdown(wait=True)
+        with self._parked_lock:
+            parked, self._parked = self._parked, {}
+        for handler, _ in parked.values():
+            self._close_parked(handler)
@@ -0,0 +1,113 @@
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkSupervisor:
+    """Pre-fork режим: слушающий сокет открывается один раз, соединения на нём принимают N дочерних процессов.
+
+    Каждый процесс обслуживает запросы своим сервером и своими соединениями с БД, поэтому GIL
+    ограничивает только его долю запросов. Супервизор перезапускает упавшие процессы, а по SIGTERM
+    или SIGINT передаёт SIGTERM детям и ждёт, пока они доработают текущие запросы.
+    """
+
+    RESTART_DELAY_SECONDS = 1.0
+    POLL_SECONDS = 0.2
+
+    def __init__(self, address: Tuple[str, int], processes: int, serve: Callable[[socket.socket], None],
+                 backlog: int = 128, graceful_timeout: float = 10.0):
+        self.address = address
+        self.processes = processes
+        self.serve = serve
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+
+
+    def run(self) -> int:
+        self.socket = socket.create_server(self.address, backlog=self.backlog)
+        # Неблокирующий accept: соединение, которое забрал соседний процесс, не подвешивает цикл сервера
+        self.socket.setblocking(False)
+        previous = {signum: signal.signal(signum, self._request_stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for _ in range(self.processes):
+                self._spawn()
+            while not self._stopping:
+                self._reap(restart=True)
+                time.sleep(self.POLL_SECONDS)
+            self._stop_children()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.socket.close()
+        return 0
+
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Ctrl+C получает вся группа процессов: останавливает детей только супервизор
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.serve(self.socket)
+        except BaseException:
+            logger.exception('Рабочий процесс %s завершился с ошибкой', os.getpid())
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+
+    def _reap(self, restart: bool) -> None:
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            started = self._children.pop(pid, None)
+            if started is None or not restart or self._stopping:
+                continue
+            logger.warning('Рабочий процесс %s завершился (код %s), перезапуск', pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < self.RESTART_DELAY_SECONDS:
+                # Процесс падает сразу после старта: не перезапускаем его в горячем цикле
+                time.sleep(self.RESTART_DELAY_SECONDS)
+            self._spawn()
+
+
+    def _stop_children(self) -> None:
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap(restart=False)
+            time.sleep(self.POLL_SECONDS / 2)
+        for pid in list(self._children):
+            logger.warning('Рабочий процесс %s не остановился за %s с, SIGKILL', pid, self.graceful_timeout)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._children.pop(pid, None)
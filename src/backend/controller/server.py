@@ -1,176 +1,491 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler
+import base64
+import itertools
 import json
+import math
+import time
 import urllib.parse
+from datetime import datetime, timezone
+from decimal import Decimal
 
 from src.backend.dao.currency_dao import CurrencyDAO
 from src.backend.dao.exchange_rate_dao import ExchangeRateDAO
+from src.backend.db.init_db import pool
+from src.backend.services import formats
+from src.backend.services.admission import admission
+from src.backend.services.metrics import metrics
+from src.backend.services.money import money
+from src.backend.services.rate_events import RateEventBroker
+from src.backend.services.response_cache import ResponseCache
+from src.backend.routing.response import (
+    build_head, header_block, CACHE_HEADERS, EVENT_STREAM_HEADERS, HTML_HEADERS, METRICS_HEADERS,
+    NEGOTIATED_HEADERS, OPTIONS_HEADERS, STREAM_JSON_HEADERS,
+)
+from src.backend.routing.router import Router
 
 from src.backend.controller.error_handler import ErrorHandler
+from src.backend.controller.pooled_server import DetachableHTTPServer
 
 
 currency_repo = CurrencyDAO()
 exchange_repo = ExchangeRateDAO()
+response_cache = ResponseCache(pool, metrics)
+pool.set_trace_callback(metrics.count_query)
+rate_events = RateEventBroker(exchange_repo.get_rate_events, exchange_repo.get_last_rate_event_id)
+exchange_repo.listeners.append(rate_events.notify)
+metrics.add_gauge('sse_subscribers', 'Подписчики /exchangeRates/stream этого процесса.', lambda: rate_events.subscriber_count)
+
+router = Router()
+route = router.route
+
+CURRENCY_PATH_ERROR = 'Некорректный формат пути: ожидается /currency/{КОД_3_БУКВЫ}'
+PAIR_PATH_ERROR = 'Некорректный формат пути: ожидается /exchangeRate/{ПАРА_6_БУКВ}'
+INDEX_BODY = "<h1>Hello World!</h1><p>Сервер работает.</p>".encode('utf-8')
+SERVER_HEADER = header_block(('Server', f'{BaseHTTPRequestHandler.server_version} {BaseHTTPRequestHandler.sys_version}'))
+EXCHANGE_RATE_FIELDS = ('id', 'baseCurrency', 'targetCurrency', 'rate')
+COMPACT_EXCHANGE_RATE_FIELDS = ('id', 'base', 'target', 'rate')
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+# n^2 ячеек: 1000 валют - это миллион курсов и ~20 МБ JSON
+MAX_MATRIX_CURRENCIES = 1000
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+# Границы datetime (годы 1-9999): за ними время не форматируется и может не влезть в INTEGER SQLite
+MIN_TIMESTAMP_MS = int(datetime(1, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+MAX_TIMESTAMP_MS = int(datetime(9999, 12, 31, 23, 59, 59, 999000, tzinfo=timezone.utc).timestamp() * 1000)
+CACHED_HEADERS = {media_type: header_block(('Content-type', content_type)) + CACHE_HEADERS
+                  for media_type, content_type in formats.CONTENT_TYPES.items()}
+DOCUMENT_HEADERS = {media_type: header_block(('Content-type', content_type)) + NEGOTIATED_HEADERS
+                    for media_type, content_type in formats.CONTENT_TYPES.items()}
+
+
+def warm_up_caches():
+    """Заполняет справочник валют, граф курсов и кеш полных списков до первого запроса."""
+    currency_repo.registry.load()
+    exchange_repo.get_rate_graph()
+    for key, builder in (('/currencies', currency_repo.get_all_currencies),
+                         ('/exchangeRates', exchange_repo.get_all_exchange_rates)):
+        for encoding in (formats.IDENTITY, 'gzip'):
+            response_cache.get(key, builder, formats.JSON, encoding)
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        after_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))['after']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Некорректное значение cursor')
+    # bool - подкласс int; значения вне INTEGER SQLite до запроса не доходят
+    if not isinstance(after_id, int) or isinstance(after_id, bool) or not 0 <= after_id < 2 ** 63:
+        raise ValueError('Некорректное значение cursor')
+    return after_id
+
+
+def parse_timestamp_ms(value, name):
+    """Unix-время в секундах или ISO 8601 (без зоны - UTC) -> миллисекунды."""
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        if not math.isfinite(seconds) or not MIN_TIMESTAMP_MS <= seconds * 1000 <= MAX_TIMESTAMP_MS:
+            raise ValueError(f'Значение {name} вне допустимого диапазона дат (годы 1-9999)')
+        return int(seconds * 1000)
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Некорректное значение {name}: ожидается Unix-время в секундах или дата ISO 8601')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    try:
+        timestamp_ms = int(moment.timestamp() * 1000)
+    except (OverflowError, ValueError):
+        raise ValueError(f'Значение {name} вне допустимого диапазона дат (годы 1-9999)')
+    return min(max(timestamp_ms, MIN_TIMESTAMP_MS), MAX_TIMESTAMP_MS)
+
+
+def parse_interval_ms(value):
+    """Интервал вида 30s, 5m, 1h, 1d, 1w или число секунд -> миллисекунды."""
+    unit = INTERVAL_UNITS.get(value[-1:])
+    number = value[:-1] if unit else value
+    try:
+        seconds = int(number) * (unit or 1)
+    except ValueError:
+        raise ValueError('Некорректное значение interval: ожидается число секунд или 30s, 5m, 1h, 1d, 1w')
+    if seconds <= 0:
+        raise ValueError('Значение interval должно быть положительным')
+    if seconds * 1000 > MAX_TIMESTAMP_MS:
+        raise ValueError('Значение interval слишком большое')
+    return seconds * 1000
 
 
 class SimpleHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Таймаут операций с сокетом: клиент, начавший и бросивший запрос, не держит поток вечно
+    timeout = 30
+
     def __init__(self, *args, **kwargs):
         self.currency_repo = currency_repo
         self.exchange_repo = exchange_repo 
+        self.response_cache = response_cache
+        self.rate_events = rate_events
+        self.metrics = metrics
+        self.admission = admission
+        self.status_code = None
+        self.request_started = None
+        self.route_label = 'other'
+        self.body_pending = False
+        self.keep_alive_pending = False
         super().__init__(*args, **kwargs)
 
+    def handle(self):
+        """Запросы одного соединения; если следующего запроса ещё нет, соединение паркуется на сервере."""
+        self.keep_alive_pending = False
+        self.handle_one_request()
+        while not self.close_connection:
+            if self.server.keep_alive and not self.request_buffered():
+                self.keep_alive_pending = not self.close_connection
+                return
+            self.handle_one_request()
+
+    def resume(self):
+        """Продолжает обработку запаркованного соединения, когда клиент прислал следующий запрос."""
+        self.handle()
+        self.finish()
+
+    def finish(self):
+        if not self.keep_alive_pending:
+            super().finish()
+
+    def request_buffered(self):
+        """Есть ли уже прочитанные или пришедшие байты следующего запроса (конвейерная отправка)."""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            self.close_connection = True
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def parse_request(self):
+        self.request_started = time.perf_counter()
+        self.status_code = None
+        self.route_label = 'other'
+        if not super().parse_request():
+            return False
+        if not self.server.keep_alive:
+            self.close_connection = True
+        # Непрочитанное тело нельзя оставить в сокете: его начало приняли бы за следующий запрос
+        self.body_pending = self.headers.get('Content-Length', '0').strip() not in ('', '0') \
+            or 'Transfer-Encoding' in self.headers
+        return True
+
+    def handle_one_request(self):
+        self.request_started = None
+        super().handle_one_request()
+        if self.request_started is not None and self.status_code is not None:
+            elapsed = time.perf_counter() - self.request_started
+            self.metrics.observe_request(self.command, self.route_label, self.status_code, elapsed, self.path)
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def response_head(self, status_code, headers, extra=None, length=None, chunked=False):
+        self.status_code = status_code
+        self.log_request(status_code)
+        if self.body_pending:
+            self.close_connection = True
+        return build_head(status_code, SERVER_HEADER, headers, extra, self.close_connection, length, chunked)
+
+    def write_response(self, status_code, headers, body=b'', extra=None):
+        """Строка статуса, заголовки и тело уходят в сокет одной записью."""
+        length = None if status_code == 304 else len(body)
+        self.wfile.write(self.response_head(status_code, headers, extra, length) + body)
+
+    def read_body(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length <= 0:
+            raise ValueError('Отсутствует тело запроса')
+        body = self.rfile.read(content_length)
+        self.body_pending = False
+        return body
+
+    def read_form(self):
+        return urllib.parse.parse_qs(self.read_body().decode('utf-8'))
+
+    def read_json_array(self, expected):
+        try:
+            data = json.loads(self.read_body().decode('utf-8'), parse_float=Decimal)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError('Некорректный JSON в теле запроса')
+        if not isinstance(data, list):
+            raise ValueError(f'Ожидается JSON-массив объектов {expected}')
+        return data
+
     @ErrorHandler.handle_errors
-    def do_GET(self):
-        parsed = urllib.parse.urlparse(self.path)
-        path = parsed.path
-        query = parsed.query
-        
-        if path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.send_header('Access-Control-Allow-Origin', '*')#
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS')#
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')#
-            self.end_headers()
-            body = "<h1>Hello World!</h1><p>Сервер работает.</p>"
-            self.wfile.write(body.encode('utf-8'))
-        
-        elif path == '/currencies':
-            currencies = self.currency_repo.get_all_currencies()
-            self.send_json_response(200, currencies)
-        
-        elif path.startswith('/currency/'):
-            parts = path.split('/')
-            if len(parts) == 3 and parts[1] == 'currency' and len(parts[2]) == 3 and parts[2].isupper():
-                currency_code = parts[2]
-                currency = self.currency_repo.get_currency_by_code(currency_code)
-                self.send_json_response(200, currency)
-            else:
-                raise ValueError('Некорректный формат пути: ожидается /currency/{КОД_3_БУКВЫ}')
-        
-        elif path == '/exchangeRates':
-            exchange_rates = self.exchange_repo.get_all_exchange_rates()
-            self.send_json_response(200, exchange_rates)
-        
-        elif path.startswith('/exchangeRate/'):
-            parts = path.split('/')
-            if len(parts) == 3 and parts[1] == 'exchangeRate' and len(parts[2]) == 6 and parts[2].isupper():
-                pair = parts[2]
-                exchange_rate = self.exchange_repo.get_exchange_rate_by_pair(pair)
-                self.send_json_response(200, exchange_rate)
-            else:
-                raise ValueError('Некорректный формат пути: ожидается /exchangeRate/{ПАРА_6_БУКВ}')
-        
-        elif path == '/exchange':
-            if not query:
-                raise ValueError('Отсутствуют query-параметры для /exchange')
-            params = urllib.parse.parse_qs(query)
-            from_currency = params.get('from', [None])[0]
-            to_currency = params.get('to', [None])[0]
-            amount_str = params.get('amount', [None])[0]
-            if not all([from_currency, to_currency, amount_str]):
-                raise ValueError('Отсутствуют обязательные параметры: from, to и amount')
-            try:
-                amount = float(amount_str)
-            except ValueError:
-                raise ValueError('Некорректное значение amount: ожидается число')
-            result = self.exchange_repo.calculate_exchange(from_currency, to_currency, amount)
-            self.send_json_response(200, result)
-        
-        else:
+    def dispatch(self):
+        path, _, query = self.path.partition('?')
+        matched = router.match(self.command, path)
+        if matched is None:
             self.send_json_response(404, 'Эндпоинт не найден')
-            
-    @ErrorHandler.handle_errors
-    def do_POST(self):
-        parsed = urllib.parse.urlparse(self.path)
-        path = parsed.path
-        
-        if path == '/currencies':
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError('Отсутствует тело запроса')
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(post_data)
-            name = params.get('name', [None])[0]
-            code = params.get('code', [None])[0]
-            sign = params.get('sign', [None])[0]
-            currency = self.currency_repo.add_currency(name, code, sign)
-            self.send_json_response(201, currency)
-        
-        elif path == '/exchangeRates':
-            content_length = int(self.headers.get('Content-Length', 0))
-            if content_length == 0:
-                raise ValueError('Отсутствует тело запроса')
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(post_data)
-            base_currency_code = params.get('baseCurrencyCode', [None])[0]
-            target_currency_code = params.get('targetCurrencyCode', [None])[0]
-            rate_str = params.get('rate', [None])[0]
-            if not rate_str:
-                raise ValueError('Отсутствует нужное поле формы (rate)')
-            try:
-                rate = float(rate_str)
-            except ValueError:
-                raise ValueError('Некорректное значение rate: ожидается число')
-            exchange_rate = self.exchange_repo.add_exchange_rate(base_currency_code, target_currency_code, rate)
-            self.send_json_response(201, exchange_rate)
-        
-        else:
-            self.send_json_response(404, 'Эндпоинт не найден')
-        
-    @ErrorHandler.handle_errors
-    def do_PATCH(self):
-        parsed = urllib.parse.urlparse(self.path)
-        path = parsed.path
-        
-        if path.startswith('/exchangeRate/'):
-            parts = path.split('/')
-            if len(parts) == 3 and parts[1] == 'exchangeRate' and len(parts[2]) == 6 and parts[2].isupper():
-                pair = parts[2]
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length == 0:
-                    raise ValueError('Отсутствует тело запроса')
-                post_data = self.rfile.read(content_length).decode('utf-8')
-                params = urllib.parse.parse_qs(post_data)
-                rate_str = params.get('rate', [None])[0]
-                if not rate_str:
-                    raise ValueError('Отсутствует нужное поле формы (rate)')
-                try:
-                    rate = float(rate_str)
-                except ValueError:
-                    raise ValueError('Некорректное значение rate: ожидается число')
-                updated_rate = self.exchange_repo.update_exchange_rate(pair, rate)
-                self.send_json_response(200, updated_rate)
-            else:
-                raise ValueError('Некорректный формат пути: ожидается /exchangeRate/{ПАРА_6_БУКВ}')
-        
+            return
+        matched_route, params = matched
+        self.route_label = matched_route.label
+        with self.admission.admit(self.client_address[0], matched_route.group, matched_route.label):
+            matched_route.handler(self, query, **params)
+
+    do_GET = do_POST = do_PATCH = dispatch
+
+    @route('GET', '/')
+    def get_index(self, query):
+        self.write_response(200, HTML_HEADERS, INDEX_BODY)
+
+    @route('GET', '/currencies')
+    def get_currencies(self, query):
+        self.send_cached_json_response('/currencies', self.currency_repo.get_all_currencies)
+
+    @route('GET', '/currency/{code:currency}', error=CURRENCY_PATH_ERROR)
+    def get_currency(self, query, code):
+        self.send_cached_json_response('/currency/' + code, lambda: self.currency_repo.get_currency_by_code(code))
+
+    @route('GET', '/exchangeRates')
+    def get_exchange_rates(self, query):
+        if query:
+            self.send_exchange_rates_page(query)
         else:
-            self.send_json_response(404, 'Эндпоинт не найден')
+            self.send_cached_json_response('/exchangeRates', self.exchange_repo.get_all_exchange_rates)
+
+    @route('GET', '/metrics')
+    def get_metrics(self, query):
+        self.write_response(200, METRICS_HEADERS, self.metrics.render().encode('utf-8'))
+
+    @route('GET', '/exchangeRates/stream')
+    def get_exchange_rates_stream(self, query):
+        params = urllib.parse.parse_qs(query)
+        last_event_id = self.headers.get('Last-Event-ID') or params.get('lastEventId', [None])[0]
+        # Поток событий ограничен закрытием соединения
+        self.close_connection = True
+        self.wfile.write(self.response_head(200, EVENT_STREAM_HEADERS))
+        # Сокет уходит брокеру событий: поток-обработчик освобождается сразу
+        self.server.detach_request(self.request)
+        self.rate_events.subscribe(self.request, last_event_id)
+
+    @route('GET', '/exchangeRate/{pair:pair}', error=PAIR_PATH_ERROR)
+    def get_exchange_rate(self, query, pair):
+        self.send_cached_json_response('/exchangeRate/' + pair, lambda: self.exchange_repo.get_exchange_rate_by_pair(pair))
+
+    @route('GET', '/exchangeRate/{pair:pair}/history', error=PAIR_PATH_ERROR)
+    def get_exchange_rate_history(self, query, pair):
+        params = urllib.parse.parse_qs(query)
+        from_str = params.get('from', [None])[0]
+        to_str = params.get('to', [None])[0]
+        interval_str = params.get('interval', [None])[0]
+        from_ms = parse_timestamp_ms(from_str, 'from') if from_str else 0
+        to_ms = parse_timestamp_ms(to_str, 'to') if to_str else 2 ** 62
+        interval_ms = parse_interval_ms(interval_str) if interval_str else None
+        history = self.exchange_repo.get_exchange_rate_history(pair, from_ms, to_ms, interval_ms)
+        self.send_json_response(200, history)
+
+    @route('GET', '/exchange')
+    def get_exchange(self, query):
+        if not query:
+            raise ValueError('Отсутствуют query-параметры для /exchange')
+        params = urllib.parse.parse_qs(query)
+        from_currency = params.get('from', [None])[0]
+        to_currency = params.get('to', [None])[0]
+        amount_str = params.get('amount', [None])[0]
+        if not all([from_currency, to_currency, amount_str]):
+            raise ValueError('Отсутствуют обязательные параметры: from, to и amount')
+        amount = money.parse(amount_str, 'amount')
+        at_str = params.get('at', [None])[0]
+        at_ms = parse_timestamp_ms(at_str, 'at') if at_str else None
+        result = self.exchange_repo.calculate_exchange(from_currency, to_currency, amount, at_ms)
+        self.send_json_response(200, result)
+
+    @route('GET', '/exchange/matrix')
+    def get_exchange_matrix(self, query):
+        params = urllib.parse.parse_qs(query)
+        base = params.get('base', ['USD'])[0]
+        if len(base) != 3 or not base.isupper():
+            raise ValueError('Некорректный код валюты в base: ожидается 3 заглавные буквы')
+        if not params.get('currencies'):
+            if len(self.currency_repo.registry.all()) > MAX_MATRIX_CURRENCIES:
+                raise ValueError(f'Валют больше {MAX_MATRIX_CURRENCIES}: укажите нужные в currencies')
+            # Полная матрица одна на базовую валюту: кешируется до следующей записи курсов
+            self.send_cached_json_response('/exchange/matrix?base=' + base,
+                                           lambda: self.exchange_repo.get_rate_matrix(None, base),
+                                           formats.DOCUMENT_MEDIA_TYPES)
+            return
+        codes = list(dict.fromkeys(code for code in params['currencies'][0].split(',') if code))
+        if not codes or any(len(code) != 3 or not code.isupper() for code in codes):
+            raise ValueError('Некорректное значение currencies: ожидаются коды валют через запятую')
+        if len(codes) > MAX_MATRIX_CURRENCIES:
+            raise ValueError(f'Слишком много валют в currencies: не больше {MAX_MATRIX_CURRENCIES}')
+        self.send_json_response(200, self.exchange_repo.get_rate_matrix(codes, base))
+
+    @route('POST', '/currencies')
+    def post_currency(self, query):
+        params = self.read_form()
+        name = params.get('name', [None])[0]
+        code = params.get('code', [None])[0]
+        sign = params.get('sign', [None])[0]
+        currency = self.currency_repo.add_currency(name, code, sign)
+        self.send_json_response(201, currency)
+
+    @route('POST', '/exchangeRates')
+    def post_exchange_rate(self, query):
+        params = self.read_form()
+        base_currency_code = params.get('baseCurrencyCode', [None])[0]
+        target_currency_code = params.get('targetCurrencyCode', [None])[0]
+        rate_str = params.get('rate', [None])[0]
+        if not rate_str:
+            raise ValueError('Отсутствует нужное поле формы (rate)')
+        rate = money.parse(rate_str, 'rate')
+        exchange_rate = self.exchange_repo.add_exchange_rate(base_currency_code, target_currency_code, rate)
+        self.send_json_response(201, exchange_rate)
+
+    @route('POST', '/exchangeRates/bulk', group='bulk')
+    def post_exchange_rates_bulk(self, query):
+        rows = self.read_json_array('{baseCurrencyCode, targetCurrencyCode, rate}')
+        summary = self.exchange_repo.upsert_exchange_rates(rows)
+        self.send_json_response(200, summary)
+
+    @route('POST', '/exchange/batch', group='bulk')
+    def post_exchange_batch(self, query):
+        items = self.read_json_array('{from, to, amount}')
+        results = self.exchange_repo.calculate_exchange_batch(items)
+        self.send_json_response(200, results)
+
+    @route('PATCH', '/exchangeRate/{pair:pair}', error=PAIR_PATH_ERROR)
+    def patch_exchange_rate(self, query, pair):
+        params = self.read_form()
+        rate_str = params.get('rate', [None])[0]
+        if not rate_str:
+            raise ValueError('Отсутствует нужное поле формы (rate)')
+        rate = money.parse(rate_str, 'rate')
+        updated_rate = self.exchange_repo.update_exchange_rate(pair, rate)
+        self.send_json_response(200, updated_rate)
 
     def send_json_response(self, status_code, data):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')#
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS')#
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')#
-        self.end_headers()
+        """Ответ в формате по Accept (JSON или MessagePack), сжатый по Accept-Encoding, если тело достаточно велико."""
         if isinstance(data, str):
             response = {'message': data}
         else:
             response = data
-        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-    
-    
+        media_type = formats.negotiate_media_type(self.headers.get('Accept'), formats.DOCUMENT_MEDIA_TYPES)
+        started = time.perf_counter()
+        body = formats.encode(response, media_type)
+        if media_type == formats.JSON:
+            self.metrics.observe_json_encode(time.perf_counter() - started)
+        body, encoding = formats.compress(body, formats.negotiate_encoding(self.headers.get('Accept-Encoding')))
+        extra = (('Content-Encoding', encoding),) if encoding != formats.IDENTITY else None
+        self.write_response(status_code, DOCUMENT_HEADERS[media_type], body, extra)
+
+    def send_exchange_rates_page(self, query):
+        """GET /exchangeRates с limit/cursor, фильтрами base/target, проекцией fields и shape=compact."""
+        params = urllib.parse.parse_qs(query)
+        shape = params.get('shape', ['full'])[0]
+        if shape not in ('full', 'compact'):
+            raise ValueError('Некорректное значение shape: ожидается full или compact')
+        compact = shape == 'compact'
+        fields = None
+        if params.get('fields'):
+            fields = [field for field in params['fields'][0].split(',') if field]
+            allowed = COMPACT_EXCHANGE_RATE_FIELDS if compact else EXCHANGE_RATE_FIELDS
+            unknown = [field for field in fields if field not in allowed]
+            if unknown or not fields:
+                raise ValueError(f'Некорректное значение fields: допустимы {", ".join(allowed)}')
+        limit = None
+        if params.get('limit'):
+            try:
+                limit = int(params['limit'][0])
+            except ValueError:
+                raise ValueError('Некорректное значение limit: ожидается целое число')
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError(f'Значение limit должно быть от 1 до {MAX_PAGE_SIZE}')
+        after_id = decode_cursor(params['cursor'][0]) if params.get('cursor') else None
+        codes = {}
+        for name in ('base', 'target'):
+            code = params.get(name, [None])[0]
+            if code is not None and (len(code) != 3 or not code.isupper()):
+                raise ValueError(f'Некорректный код валюты в {name}: ожидается 3 заглавные буквы')
+            codes[name] = code
+
+        items = self.exchange_repo.iter_exchange_rates(after_id, None if limit is None else limit + 1,
+                                                       codes['base'], codes['target'], compact)
+        headers = {}
+        if limit is not None:
+            page = list(items)
+            if len(page) > limit:
+                page = page[:limit]
+                next_cursor = encode_cursor(page[-1]['id'])
+                params['cursor'] = [next_cursor]
+                headers['X-Next-Cursor'] = next_cursor
+                headers['Link'] = f'</exchangeRates?{urllib.parse.urlencode(params, doseq=True)}>; rel="next"'
+            items = iter(page)
+        if fields is not None:
+            items = ({field: item[field] for field in fields} for item in items)
+        self.send_json_stream(200, items, headers)
+
+    def send_json_stream(self, status_code, items, headers=None):
+        """Пишет JSON-массив порциями по мере чтения из БД: весь ответ не собирается в памяти."""
+        # Первая порция читается до заголовков, чтобы ошибки запроса ещё можно было отдать обычным ответом
+        batch = list(itertools.islice(items, STREAM_BATCH_SIZE))
+        chunked = self.request_version == 'HTTP/1.1'
+        if not chunked:
+            self.close_connection = True
+        head = self.response_head(status_code, STREAM_JSON_HEADERS, (headers or {}).items(), chunked=chunked)
+
+        def write(data, trailer=b''):
+            nonlocal head
+            if chunked:
+                data = b'%x\r\n%s\r\n' % (len(data), data)
+            # Заголовки уходят одной записью вместе с первой порцией тела
+            self.wfile.write(head + data + trailer)
+            head = b''
+
+        separator = b'['
+        encode_seconds = 0.0
+        while batch:
+            started = time.perf_counter()
+            # Массив из порции без внешних скобок: json.dumps на порцию быстрее, чем на каждый элемент
+            body = json.dumps(batch, ensure_ascii=False).encode('utf-8')[1:-1]
+            encode_seconds += time.perf_counter() - started
+            write(separator + body)
+            separator = b','
+            batch = list(itertools.islice(items, STREAM_BATCH_SIZE))
+        write(b'[]' if separator == b'[' else b']', b'0\r\n\r\n' if chunked else b'')
+        self.metrics.observe_json_encode(encode_seconds)
+
+    def send_cached_json_response(self, key, builder, offered=formats.ALL_MEDIA_TYPES):
+        """Отдаёт закешированное тело ответа; при совпадении If-None-Match отвечает 304 без тела.
+
+        Формат (JSON, MessagePack, CSV) и сжатие выбираются по Accept и Accept-Encoding; каждый
+        вариант кодируется один раз на версию данных и имеет свой ETag.
+        """
+        media_type = formats.negotiate_media_type(self.headers.get('Accept'), offered)
+        encoding = formats.negotiate_encoding(self.headers.get('Accept-Encoding'))
+        cached = self.response_cache.get(key, builder, media_type, encoding)
+        if_none_match = self.headers.get('If-None-Match')
+        not_modified = if_none_match is not None and (
+            if_none_match.strip() == '*' or cached.etag in [tag.strip() for tag in if_none_match.split(',')])
+        extra = [('ETag', cached.etag), ('Last-Modified', cached.last_modified)]
+        if cached.encoding != formats.IDENTITY:
+            extra.append(('Content-Encoding', cached.encoding))
+        self.write_response(304 if not_modified else 200, CACHED_HEADERS[media_type],
+                            b'' if not_modified else cached.body, extra)
+
     @ErrorHandler.handle_errors
     def do_OPTIONS(self):
         """Обрабатывает preflight-запросы CORS для браузера (например, перед POST/PATCH). Возвращает 200 без тела."""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')  # 
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS')  # 
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')  #
-        self.end_headers()    
+        self.write_response(200, OPTIONS_HEADERS)
 
 
 if __name__ == '__main__':
-    server = HTTPServer(('localhost', 8000), SimpleHandler)
+    server = DetachableHTTPServer(('localhost', 8000), SimpleHandler)
     print("Сервер запущен на http://localhost:8000")
     server.serve_forever()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from abc import ABC
 
 class BaseDAO(ABC):
-    def __init__(self, conn):
-        self.conn = conn
\ No newline at end of file
+    def __init__(self, pool):
+        self.pool = pool
\ No newline at end of file
@@ -1,161 +1,531 @@
 import sqlite3
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, Iterator, List, Dict, Any, Optional
 
 from src.backend.dao.base_dao import BaseDAO
-from src.backend.db.init_db import connection
+from src.backend.db.init_db import pool
+from src.backend.models.currency import Currency
+from src.backend.services.currency_registry import currency_registry
+from src.backend.services.group_commit import GroupCommitQueue
+from src.backend.services.metrics import metrics
+from src.backend.services.money import money
+from src.backend.services.rate_graph import RateGraph
+from src.backend.services.rate_matrix import cross_rates, cross_rates_exact
+
+
+# Сколько последних событий хранит RateEvents: столько может досылаться при переподключении
+RATE_EVENT_RETENTION = 10000
+RECORD_RATE_EVENT_SQL = '''
+    INSERT INTO RateEvents (ExchangeRateId, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal)
+    SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates
+    WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+'''
 
 
 class ExchangeRateDAO(BaseDAO):
-    def __init__(self, conn = connection):
-        self.conn = conn
+    def __init__(self, pool = pool, registry = currency_registry):
+        self.pool = pool
+        self.registry = registry
+        self._rate_graph = None
+        self._rate_graph_lock = threading.Lock()
+        # Вызываются после commit записи курсов; сами события читаются из RateEvents
+        self.listeners: List[Callable[[], None]] = []
+        self.write_queue: Optional[GroupCommitQueue] = None
         
 
+    @metrics.track_dao
     def get_all_exchange_rates(self) -> List[Dict[str, Any]]:
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT er.ID, er.Rate, 
-                bc.ID AS base_id, bc.FullName AS base_name, bc.Code AS base_code, bc.Sign AS base_sign,
-                tc.ID AS target_id, tc.FullName AS target_name, tc.Code AS target_code, tc.Sign AS target_sign
-            FROM ExchangeRates er
-            JOIN Currencies bc ON er.BaseCurrencyId = bc.ID
-            JOIN Currencies tc ON er.TargetCurrencyId = tc.ID
-        ''')
+        cursor = self.pool.reader().cursor()
+        cursor.execute('SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates')
         rows = cursor.fetchall()
-        return [{
-            'id': row['ID'],
-            'baseCurrency': {'id': row['base_id'], 'name': row['base_name'], 'code': row['base_code'], 'sign': row['base_sign']},
-            'targetCurrency': {'id': row['target_id'], 'name': row['target_name'], 'code': row['target_code'], 'sign': row['target_sign']},
-            'rate': row['Rate']
-        } for row in rows]
+        return [self._row_to_exchange_rate(row) for row in rows]
+
 
+    def iter_exchange_rates(self, after_id: Optional[int] = None, limit: Optional[int] = None,
+                            base_code: Optional[str] = None, target_code: Optional[str] = None,
+                            compact: bool = False, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Курсы по возрастанию ID порциями из курсора, без сборки всего списка в памяти.
 
+        compact=True отдаёт коды валют вместо вложенных объектов. Неизвестная валюта в фильтре даёт пустой результат.
+        """
+        conditions, params = [], []
+        for column, code in (('BaseCurrencyId', base_code), ('TargetCurrencyId', target_code)):
+            if code is not None:
+                currency = self.registry.by_code(code)
+                if currency is None:
+                    return
+                conditions.append(f'{column} = ?')
+                params.append(currency.id)
+        if after_id is not None:
+            conditions.append('ID > ?')
+            params.append(after_id)
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        limit_clause = 'LIMIT ?' if limit is not None else ''
+        if limit is not None:
+            params.append(limit)
+        cursor = self.pool.reader().cursor()
+        cursor.execute(f'''
+            SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal
+            FROM ExchangeRates
+            {where}
+            ORDER BY ID
+            {limit_clause}
+        ''', params)
+        by_id = self._currency_by_id
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                if compact:
+                    yield {'id': row['ID'], 'base': by_id(row['BaseCurrencyId']).code,
+                           'target': by_id(row['TargetCurrencyId']).code,
+                           'rate': money.rate_value(row['Rate'], row['RateDecimal'])}
+                else:
+                    yield self._row_to_exchange_rate(row)
+
+
+    @metrics.track_dao
     def get_exchange_rate_by_pair(self, pair: str) -> Optional[Dict[str, Any]]:
         if not pair or len(pair) != 6 or not pair.isupper():
             raise ValueError('Коды валют пары отсутствуют в адресе или некорректные (ожидается 6 заглавных букв)')
-        base_code, target_code = pair[:3], pair[3:]
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT er.ID, er.Rate, 
-                bc.ID AS base_id, bc.FullName AS base_name, bc.Code AS base_code, bc.Sign AS base_sign,
-                tc.ID AS target_id, tc.FullName AS target_name, tc.Code AS target_code, tc.Sign AS target_sign
-            FROM ExchangeRates er
-            JOIN Currencies bc ON er.BaseCurrencyId = bc.ID
-            JOIN Currencies tc ON er.TargetCurrencyId = tc.ID
-            WHERE bc.Code = ? AND tc.Code = ?
-        ''', (base_code, target_code))
-        row = cursor.fetchone()
-        if row:
-            return {
-                'id': row['ID'],
-                'baseCurrency': {'id': row['base_id'], 'name': row['base_name'], 'code': row['base_code'], 'sign': row['base_sign']},
-                'targetCurrency': {'id': row['target_id'], 'name': row['target_name'], 'code': row['target_code'], 'sign': row['target_sign']},
-                'rate': row['Rate']
-            }
+        base, target = self.registry.by_code(pair[:3]), self.registry.by_code(pair[3:])
+        if base is not None and target is not None:
+            cursor = self.pool.reader().cursor()
+            cursor.execute('''
+                SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates
+                WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+            ''', (base.id, target.id))
+            row = cursor.fetchone()
+            if row:
+                return self._row_to_exchange_rate(row)
         raise KeyError('Обменный курс для пары не найден')
 
 
+    @metrics.track_dao
     def add_exchange_rate(self, base_code: str, target_code: str, rate: float) -> Dict[str, Any]:
         if not all([base_code, target_code, rate is not None]):
             raise ValueError('Отсутствует нужное поле формы (baseCurrencyCode, targetCurrencyCode, rate)')
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT ID FROM Currencies WHERE Code = ?', (base_code,))
-        base_id = cursor.fetchone()
-        cursor.execute('SELECT ID FROM Currencies WHERE Code = ?', (target_code,))
-        target_id = cursor.fetchone()
-        if not base_id or not target_id:
+        float_rate, decimal_rate = money.to_stored(rate)
+        base, target = self.registry.by_code(base_code), self.registry.by_code(target_code)
+        if base is None or target is None:
             raise KeyError('Одна (или обе) валюта из валютной пары не существует в БД')
-        try:
-            cursor.execute('INSERT INTO ExchangeRates (BaseCurrencyId, TargetCurrencyId, Rate) VALUES (?, ?, ?)', 
-                        (base_id['ID'], target_id['ID'], rate))
-            rate_id = cursor.lastrowid
-            self.conn.commit()
-            return self.get_exchange_rate_by_id(rate_id)
-        except sqlite3.IntegrityError:
-            raise sqlite3.IntegrityError('Валютная пара с таким кодом уже существует')
+        # Вставки не схлопываются: повтор пары в пакете должен получить свой 409
+        return self._write_rate(('insert', base.id, target.id, float_rate, decimal_rate), None)
 
 
+    @metrics.track_dao
     def update_exchange_rate(self, pair: str, rate: float) -> Dict[str, Any]:
         if not pair or len(pair) != 6 or not pair.isupper():
             raise ValueError('Валютная пара отсутствует в адресе или некорректная')
         if rate is None:
             raise ValueError('Отсутствует нужное поле формы (rate)')
-        base_code, target_code = pair[:3], pair[3:]
-        cursor = self.conn.cursor()
+        float_rate, decimal_rate = money.to_stored(rate)
+        base, target = self.registry.by_code(pair[:3]), self.registry.by_code(pair[3:])
+        if base is None or target is None:
+            raise KeyError('Валютная пара отсутствует в базе данных')
+        return self._write_rate(('update', base.id, target.id, float_rate, decimal_rate), (base.id, target.id))
+
+
+    def enable_group_commit(self, max_batch: int = 256, max_delay: float = 0.0) -> None:
+        """Добавление и обновление курсов идут через фоновый писатель с групповым commit."""
+        self.write_queue = GroupCommitQueue(self.pool, self._apply_rate_write, self._after_rate_writes,
+                                            max_batch, max_delay)
+
+
+    def _write_rate(self, payload: tuple, key: Optional[tuple]) -> Dict[str, Any]:
+        if self.write_queue is not None:
+            return self.write_queue.submit(payload, key).result()
+        with self.pool.writer() as conn:
+            result = self._apply_rate_write(conn.cursor(), payload)
+        return self._after_rate_writes([result])[0]
+
+
+    def _apply_rate_write(self, cursor: sqlite3.Cursor, payload: tuple) -> tuple:
+        """Одна запись курса внутри открытой транзакции; возвращает (BaseCurrencyId, TargetCurrencyId)."""
+        operation, base_id, target_id, rate, decimal_rate = payload
+        if operation == 'insert':
+            try:
+                cursor.execute('INSERT INTO ExchangeRates (BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal) VALUES (?, ?, ?, ?)',
+                               (base_id, target_id, rate, decimal_rate))
+            except sqlite3.IntegrityError:
+                raise sqlite3.IntegrityError('Валютная пара с таким кодом уже существует')
+            cursor.execute('INSERT OR REPLACE INTO ExchangeRateHistory (ExchangeRateId, Timestamp, Rate, RateDecimal) VALUES (?, ?, ?, ?)',
+                           (cursor.lastrowid, self._now_ms(), rate, decimal_rate))
+            self._record_rate_event(cursor, base_id, target_id)
+            return base_id, target_id
         cursor.execute('''
-            UPDATE ExchangeRates SET Rate = ? 
-            WHERE BaseCurrencyId = (SELECT ID FROM Currencies WHERE Code = ?) 
-            AND TargetCurrencyId = (SELECT ID FROM Currencies WHERE Code = ?)
-        ''', (rate, base_code, target_code))
+            UPDATE ExchangeRates SET Rate = ?, RateDecimal = ?
+            WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+        ''', (rate, decimal_rate, base_id, target_id))
         if cursor.rowcount == 0:
             raise KeyError('Валютная пара отсутствует в базе данных')
-        self.conn.commit()
-        return self.get_exchange_rate_by_pair(pair)
+        cursor.execute('''
+            INSERT OR REPLACE INTO ExchangeRateHistory (ExchangeRateId, Timestamp, Rate, RateDecimal)
+            SELECT ID, ?, Rate, RateDecimal FROM ExchangeRates WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+        ''', (self._now_ms(), base_id, target_id))
+        self._record_rate_event(cursor, base_id, target_id)
+        return base_id, target_id
+
 
+    @staticmethod
+    def _record_rate_event(cursor: sqlite3.Cursor, base_id: int, target_id: int) -> None:
+        cursor.execute(RECORD_RATE_EVENT_SQL, (base_id, target_id))
+        if cursor.lastrowid % 1000 == 0:
+            cursor.execute('DELETE FROM RateEvents WHERE ID <= ?', (cursor.lastrowid - RATE_EVENT_RETENTION,))
 
-    def get_exchange_rate_by_id(self, rate_id: int) -> Dict[str, Any]:
-        cursor = self.conn.cursor()
+
+    def _after_rate_writes(self, id_pairs: List[tuple]) -> List[Dict[str, Any]]:
+        """После commit: сброс кешей, чтение записанных курсов и уведомление подписчиков, по разу на пару."""
+        self.pool.bump_version()
+        self.invalidate_rate_graph()
+        written = {(item['baseCurrency']['id'], item['targetCurrency']['id']): item
+                   for item in self._get_exchange_rates_by_currency_ids(list(dict.fromkeys(id_pairs)))}
+        self._notify()
+        return [written[id_pair] for id_pair in id_pairs]
+
+
+    @metrics.track_dao
+    def upsert_exchange_rates(self, rows: List[Any]) -> Dict[str, Any]:
+        """Вставляет или обновляет много курсов одной транзакцией.
+
+        Некорректные строки пропускаются и перечисляются в errors; повтор пары внутри пакета - побеждает последний.
+        """
+        errors = []
+        parsed = {}
+        for index, row in enumerate(rows):
+            try:
+                base_code, target_code, rate, decimal_rate = self._parse_bulk_row(row)
+            except ValueError as e:
+                errors.append({'index': index, 'message': str(e)})
+                continue
+            parsed[(base_code, target_code)] = (index, rate, decimal_rate)
+
+        params = []
+        for (base_code, target_code), (index, rate, decimal_rate) in parsed.items():
+            base, target = self.registry.by_code(base_code), self.registry.by_code(target_code)
+            if base is None or target is None:
+                errors.append({'index': index, 'message': 'Одна (или обе) валюта из валютной пары не существует в БД'})
+                continue
+            params.append((base.id, target.id, rate, decimal_rate))
+
+        if params:
+            with self.pool.writer() as conn:
+                conn.executemany('''
+                    INSERT INTO ExchangeRates (BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (BaseCurrencyId, TargetCurrencyId) DO UPDATE SET Rate = excluded.Rate, RateDecimal = excluded.RateDecimal
+                ''', params)
+                now_ms = self._now_ms()
+                conn.executemany('''
+                    INSERT OR REPLACE INTO ExchangeRateHistory (ExchangeRateId, Timestamp, Rate, RateDecimal)
+                    SELECT ID, ?, Rate, RateDecimal FROM ExchangeRates WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+                ''', [(now_ms, base_id, target_id) for base_id, target_id, _, _ in params])
+                conn.executemany(RECORD_RATE_EVENT_SQL, [(base_id, target_id) for base_id, target_id, _, _ in params])
+                conn.execute('DELETE FROM RateEvents WHERE ID <= (SELECT MAX(ID) FROM RateEvents) - ?', (RATE_EVENT_RETENTION,))
+            self.pool.bump_version()
+            self.invalidate_rate_graph()
+            self._notify()
+        errors.sort(key=lambda error: error['index'])
+        return {'received': len(rows), 'applied': len(params), 'errors': errors}
+
+
+    def _get_exchange_rates_by_currency_ids(self, id_pairs: List[tuple]) -> List[Dict[str, Any]]:
+        cursor = self.pool.reader().cursor()
+        exchange_rates = []
+        for start in range(0, len(id_pairs), 400):
+            chunk = id_pairs[start:start + 400]
+            cursor.execute(f'''
+                SELECT ID, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates
+                WHERE (BaseCurrencyId, TargetCurrencyId) IN (VALUES {', '.join(['(?, ?)'] * len(chunk))})
+            ''', [currency_id for pair in chunk for currency_id in pair])
+            exchange_rates.extend(self._row_to_exchange_rate(row) for row in cursor.fetchall())
+        return exchange_rates
+
+
+    def _notify(self) -> None:
+        for listener in self.listeners:
+            listener()
+
+
+    def get_rate_events(self, after_id: int, limit: int) -> List[tuple]:
+        """События изменения курсов с ID > after_id по возрастанию: (id события, курс как в ответе API).
+
+        Пишутся в одной транзакции с курсом любым процессом, поэтому видны подписчикам всех процессов.
+        """
+        cursor = self.pool.reader().cursor()
         cursor.execute('''
-            SELECT er.ID, er.Rate, 
-                bc.ID AS base_id, bc.FullName AS base_name, bc.Code AS base_code, bc.Sign AS base_sign,
-                tc.ID AS target_id, tc.FullName AS target_name, tc.Code AS target_code, tc.Sign AS target_sign
-            FROM ExchangeRates er
-            JOIN Currencies bc ON er.BaseCurrencyId = bc.ID
-            JOIN Currencies tc ON er.TargetCurrencyId = tc.ID
-            WHERE er.ID = ?
-        ''', (rate_id,))
-        row = cursor.fetchone()
+            SELECT ID, ExchangeRateId, BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM RateEvents
+            WHERE ID > ? ORDER BY ID LIMIT ?
+        ''', (after_id, limit))
+        by_id = self._currency_by_id
+        return [(row['ID'], {
+            'id': row['ExchangeRateId'],
+            'baseCurrency': by_id(row['BaseCurrencyId']).as_dict,
+            'targetCurrency': by_id(row['TargetCurrencyId']).as_dict,
+            'rate': money.rate_value(row['Rate'], row['RateDecimal'])
+        }) for row in cursor.fetchall()]
+
+
+    def get_last_rate_event_id(self) -> int:
+        cursor = self.pool.reader().cursor()
+        cursor.execute('SELECT MAX(ID) FROM RateEvents')
+        return cursor.fetchone()[0] or 0
+
+
+    @staticmethod
+    def _parse_bulk_row(row: Any) -> tuple:
+        if not isinstance(row, dict):
+            raise ValueError('Элемент пакета должен быть объектом {baseCurrencyCode, targetCurrencyCode, rate}')
+        base_code, target_code, rate = row.get('baseCurrencyCode'), row.get('targetCurrencyCode'), row.get('rate')
+        if not all([base_code, target_code, rate is not None]):
+            raise ValueError('Отсутствует нужное поле (baseCurrencyCode, targetCurrencyCode, rate)')
+        if not isinstance(base_code, str) or not isinstance(target_code, str):
+            raise ValueError('Коды валют должны быть строками')
+        if isinstance(rate, bool):
+            raise ValueError('Некорректное значение rate: ожидается число')
+        float_rate, decimal_rate = money.to_stored(rate)
+        return base_code, target_code, float_rate, decimal_rate
+
+
+    @metrics.track_dao
+    def get_exchange_rate_history(self, pair: str, from_ms: int, to_ms: int, interval_ms: Optional[int] = None) -> Dict[str, Any]:
+        """История курса пары за [from_ms, to_ms). С interval_ms точки сворачиваются в OHLC-свечи на стороне SQLite."""
+        exchange_rate = self.get_exchange_rate_by_pair(pair)
+        cursor = self.pool.reader().cursor()
+        if interval_ms is None:
+            cursor.execute('''
+                SELECT Timestamp, Rate, RateDecimal FROM ExchangeRateHistory
+                WHERE ExchangeRateId = ? AND Timestamp >= ? AND Timestamp < ?
+                ORDER BY Timestamp
+            ''', (exchange_rate['id'], from_ms, to_ms))
+            points = [{'timestamp': self._format_ms(row['Timestamp']), 'rate': money.rate_value(row['Rate'], row['RateDecimal'])}
+                      for row in cursor.fetchall()]
+        else:
+            cursor.execute('''
+                SELECT b.bucket, b.low, b.high, b.ticks, o.Rate AS open, o.RateDecimal AS open_decimal,
+                    c.Rate AS close, c.RateDecimal AS close_decimal,
+                    -- Экстремумы ищутся по REAL Rate, а их точная запись берётся из той же строки истории
+                    (SELECT RateDecimal FROM ExchangeRateHistory WHERE ExchangeRateId = :id
+                     AND Timestamp BETWEEN b.first_ts AND b.last_ts AND Rate = b.low LIMIT 1) AS low_decimal,
+                    (SELECT RateDecimal FROM ExchangeRateHistory WHERE ExchangeRateId = :id
+                     AND Timestamp BETWEEN b.first_ts AND b.last_ts AND Rate = b.high LIMIT 1) AS high_decimal
+                FROM (
+                    SELECT Timestamp / :interval AS bucket, MIN(Rate) AS low, MAX(Rate) AS high, COUNT(*) AS ticks,
+                        MIN(Timestamp) AS first_ts, MAX(Timestamp) AS last_ts
+                    FROM ExchangeRateHistory
+                    WHERE ExchangeRateId = :id AND Timestamp >= :from_ms AND Timestamp < :to_ms
+                    GROUP BY bucket
+                ) b
+                JOIN ExchangeRateHistory o ON o.ExchangeRateId = :id AND o.Timestamp = b.first_ts
+                JOIN ExchangeRateHistory c ON c.ExchangeRateId = :id AND c.Timestamp = b.last_ts
+                ORDER BY b.bucket
+            ''', {'id': exchange_rate['id'], 'interval': interval_ms, 'from_ms': from_ms, 'to_ms': to_ms})
+            points = [{
+                'timestamp': self._format_ms(row['bucket'] * interval_ms),
+                'open': money.rate_value(row['open'], row['open_decimal']),
+                'high': money.rate_value(row['high'], row['high_decimal']),
+                'low': money.rate_value(row['low'], row['low_decimal']),
+                'close': money.rate_value(row['close'], row['close_decimal']),
+                'ticks': row['ticks']
+            } for row in cursor.fetchall()]
+        return {
+            'baseCurrency': exchange_rate['baseCurrency'],
+            'targetCurrency': exchange_rate['targetCurrency'],
+            'interval': interval_ms // 1000 if interval_ms is not None else None,
+            'points': points
+        }
+
+
+    @staticmethod
+    def _now_ms() -> int:
+        return int(time.time() * 1000)
+
+
+    @staticmethod
+    def _format_ms(timestamp_ms: int) -> str:
+        return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+    def _row_to_exchange_rate(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Строка ExchangeRates (только ID валют) -> курс с валютами из справочника в памяти."""
         return {
             'id': row['ID'],
-            'baseCurrency': {'id': row['base_id'], 'name': row['base_name'], 'code': row['base_code'], 'sign': row['base_sign']},
-            'targetCurrency': {'id': row['target_id'], 'name': row['target_name'], 'code': row['target_code'], 'sign': row['target_sign']},
-            'rate': row['Rate']
+            'baseCurrency': self._currency_by_id(row['BaseCurrencyId']).as_dict,
+            'targetCurrency': self._currency_by_id(row['TargetCurrencyId']).as_dict,
+            'rate': money.rate_value(row['Rate'], row['RateDecimal'])
         }
 
 
-    def calculate_exchange(self, from_code: str, to_code: str, amount: float) -> Dict[str, Any]:
+    def _currency_by_id(self, currency_id: int) -> Currency:
+        currency = self.registry.by_id(currency_id)
+        if currency is None:
+            raise KeyError('Валюта не найдена')
+        return currency
+
+
+    @metrics.track_dao
+    def calculate_exchange(self, from_code: str, to_code: str, amount: float, at_ms: Optional[int] = None) -> Dict[str, Any]:
         if not all([from_code, to_code, amount is not None]):
             raise ValueError('Отсутствуют параметры from, to или amount')
-        amount = float(amount)
-        usd_rate_from = self._get_rate_for_pair('USD', from_code)
-        usd_rate_to = self._get_rate_for_pair('USD', to_code)
-        if usd_rate_from and usd_rate_to:
-            direct_rate = usd_rate_to / usd_rate_from
-            converted = amount * direct_rate
-            return self._build_exchange_response(from_code, to_code, direct_rate, amount, converted)
-        
-        raise KeyError('Невозможно рассчитать обмен: нет подходящих курсов')
+        amount = money.parse(amount, 'amount')
+        graph = self.get_rate_graph() if at_ms is None else self._load_historical_rate_graph(at_ms)
+        rate = graph.find_rate(from_code, to_code)
+        if rate is None:
+            raise KeyError('Невозможно рассчитать обмен: нет подходящих курсов')
+        return self._build_exchange_response(graph, from_code, to_code, rate, amount, amount * rate)
+
+
+    @metrics.track_dao
+    def calculate_exchange_batch(self, items: List[Any]) -> List[Dict[str, Any]]:
+        """Конвертирует много сумм за один проход: курс ищется один раз на каждую различную пару.
+
+        Ошибка в отдельном элементе попадает в его результат как {'message': ...} и не валит весь пакет.
+        """
+        graph = self.get_rate_graph()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        pair_rates: Dict[tuple, Optional[float]] = {}
+        indexes, pairs, amounts = [], [], []
+        for index, item in enumerate(items):
+            try:
+                from_code, to_code, amount = self._parse_batch_item(item)
+            except ValueError as e:
+                results[index] = {'message': str(e)}
+                continue
+            pair = (from_code, to_code)
+            if pair not in pair_rates:
+                pair_rates[pair] = graph.find_rate(from_code, to_code)
+            if pair_rates[pair] is None:
+                results[index] = {'message': 'Невозможно рассчитать обмен: нет подходящих курсов'}
+                continue
+            indexes.append(index)
+            pairs.append(pair)
+            amounts.append(amount)
 
+        rates = [pair_rates[pair] for pair in pairs]
+        converted = [amount * rate for amount, rate in zip(amounts, rates)]
+        for index, (from_code, to_code), rate, amount, converted_amount in zip(indexes, pairs, rates, amounts, converted):
+            try:
+                results[index] = self._build_exchange_response(graph, from_code, to_code, rate, amount, converted_amount)
+            except ValueError as e:
+                results[index] = {'message': str(e)}
+        return results
 
-    def _get_rate_for_pair(self, base_code: str, target_code: str) -> Optional[float]:
-        cursor = self.conn.cursor()
+
+    @metrics.track_dao
+    def get_rate_matrix(self, codes: Optional[List[str]], base: str) -> Dict[str, Any]:
+        """Кросс-курсы всех валют codes (по умолчанию всех) друг к другу через курсы к base.
+
+        rates[i * n + j] - сколько currencies[j] дают за единицу currencies[i]. Вектор курсов base
+        берётся из графа (один обход на версию данных), матрица - одним внешним делением. Валюты,
+        не связанные с base цепочкой курсов, получают None во всей строке и столбце.
+        """
+        graph = self.get_rate_graph()
+        if base not in graph.currencies:
+            raise KeyError('Валюта не найдена')
+        if codes is None:
+            codes = list(graph.currencies)
+        else:
+            unknown = [code for code in codes if code not in graph.currencies]
+            if unknown:
+                raise KeyError(f'Валюта не найдена: {", ".join(unknown)}')
+        # Неокруглённые курсы: округление до шага хранения делается один раз, уже для частного
+        paths = graph.path_rates(base)
+        vector = [paths.get(code) for code in codes]
+        if money.exact:
+            rates = [None if rate is None else money.format_rate(rate)
+                     for rate in cross_rates_exact(vector, money.quantize_rate)]
+        else:
+            rates = cross_rates(vector)
+        return {'base': base, 'currencies': codes, 'rates': rates}
+
+
+    @staticmethod
+    def _parse_batch_item(item: Any) -> tuple:
+        if not isinstance(item, dict):
+            raise ValueError('Элемент пакета должен быть объектом {from, to, amount}')
+        from_code, to_code, amount = item.get('from'), item.get('to'), item.get('amount')
+        if not all([from_code, to_code, amount is not None]):
+            raise ValueError('Отсутствуют параметры from, to или amount')
+        if not isinstance(from_code, str) or not isinstance(to_code, str):
+            raise ValueError('Коды валют from и to должны быть строками')
+        return from_code, to_code, money.parse(amount, 'amount')
+
+
+    def get_rate_graph(self) -> RateGraph:
+        """Граф курсов, построенный для текущей версии данных пула (в том числе после записи другим процессом)."""
+        version = self.pool.version
+        cached = self._rate_graph
+        if cached is None or cached[0] != version:
+            with self._rate_graph_lock:
+                cached = self._rate_graph
+                if cached is None or cached[0] != version:
+                    # Версия читается до загрузки: граф, построенный во время записи, перестроится на следующем запросе
+                    cached = self._rate_graph = (version, self._load_rate_graph())
+        return cached[1]
+
+
+    def invalidate_rate_graph(self) -> None:
+        self._rate_graph = None
+
+
+    def _load_currencies_by_code(self) -> Dict[str, Dict[str, Any]]:
+        return {currency.code: currency.as_dict for currency in self.registry.all()}
+
+
+    @metrics.track_dao
+    def _load_historical_rate_graph(self, at_ms: int) -> RateGraph:
+        """Граф из последних известных на момент at_ms курсов; каждая пара ищется по индексу (пара, время)."""
+        currencies = self._load_currencies_by_code()
+        cursor = self.pool.reader().cursor()
         cursor.execute('''
-            SELECT er.Rate FROM ExchangeRates er
-            JOIN Currencies bc ON er.BaseCurrencyId = bc.ID
-            JOIN Currencies tc ON er.TargetCurrencyId = tc.ID
-            WHERE bc.Code = ? AND tc.Code = ?
-        ''', (base_code, target_code))
-        row = cursor.fetchone()
-        return row['Rate'] if row else None
-
-
-    def _build_exchange_response(self, from_code: str, to_code: str, rate: float, amount: float, converted: float) -> Dict[str, Any]:
-        base_currency = self.get_currency_by_code(from_code)
-        target_currency = self.get_currency_by_code(to_code)
+            SELECT er.BaseCurrencyId, er.TargetCurrencyId, h.Rate, h.RateDecimal
+            FROM ExchangeRates er
+            JOIN ExchangeRateHistory h ON h.ExchangeRateId = er.ID AND h.Timestamp = (
+                SELECT MAX(Timestamp) FROM ExchangeRateHistory WHERE ExchangeRateId = er.ID AND Timestamp <= ?)
+        ''', (at_ms,))
+        rows = cursor.fetchall()
+        by_id = self._currency_by_id
+        if money.exact:
+            rates = [(by_id(row['BaseCurrencyId']).code, by_id(row['TargetCurrencyId']).code,
+                      money.stored_rate(row['Rate'], row['RateDecimal']))
+                     for row in rows]
+            return RateGraph(currencies, rates, Decimal(1), money.quantize_rate)
+        return RateGraph(currencies, [(by_id(row['BaseCurrencyId']).code, by_id(row['TargetCurrencyId']).code, row['Rate'])
+                                      for row in rows])
+
+
+    @metrics.track_dao
+    def _load_rate_graph(self) -> RateGraph:
+        currencies = self._load_currencies_by_code()
+        cursor = self.pool.reader().cursor()
+        cursor.execute('SELECT BaseCurrencyId, TargetCurrencyId, Rate, RateDecimal FROM ExchangeRates')
+        rows = cursor.fetchall()
+        by_id = self._currency_by_id
+        if money.exact:
+            rates = [(by_id(row['BaseCurrencyId']).code, by_id(row['TargetCurrencyId']).code,
+                      money.stored_rate(row['Rate'], row['RateDecimal']))
+                     for row in rows]
+            return RateGraph(currencies, rates, Decimal(1), money.quantize_rate)
+        return RateGraph(currencies, [(by_id(row['BaseCurrencyId']).code, by_id(row['TargetCurrencyId']).code, row['Rate'])
+                                      for row in rows])
+
+
+    def _build_exchange_response(self, graph: RateGraph, from_code: str, to_code: str, rate: Any, amount: Any, converted: Any) -> Dict[str, Any]:
+        if money.exact:
+            return {
+                'baseCurrency': dict(graph.currencies[from_code]),
+                'targetCurrency': dict(graph.currencies[to_code]),
+                'rate': money.format_rate(rate),
+                'amount': money.serialize(amount),
+                'convertedAmount': money.serialize(money.round_amount(converted, to_code))
+            }
         return {
-            'baseCurrency': base_currency,
-            'targetCurrency': target_currency,
+            'baseCurrency': dict(graph.currencies[from_code]),
+            'targetCurrency': dict(graph.currencies[to_code]),
             'rate': rate,
             'amount': amount,
             'convertedAmount': converted
         }
-        
-        
-    def get_currency_by_code(self, code: str) -> Optional[Dict[str, Any]]:
-        if not code or len(code) != 3 or not code.isupper():
-            raise ValueError('Код валюты отсутствует в адресе или некорректный (ожидается 3 заглавные буквы)')
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT ID, FullName, Code, Sign FROM Currencies WHERE Code = ?', (code,))
-        row = cursor.fetchone()
-        if row:
-            return {'id': row['ID'], 'name': row['FullName'], 'code': row['Code'], 'sign': row['Sign']}
-        raise KeyError('Валюта не найдена')
\ No newline at end of file
@@ -1,61 +1,192 @@
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+from src.backend.db.migrations import migrate
 
 
 DB_PATH = "exchange_rates.db"
+MEMORY_DB_PATH = ':memory:'
+
+
+class ConnectionPool:
+    """Соединения с БД: своё read-only соединение на каждый поток и одно общее соединение-писатель.
+
+    Чтения в WAL-режиме идут параллельно, записи сериализуются блокировкой писателя.
+    version увеличивается после каждой записи и служит ключом для кешей поверх БД.
+    При shared=True в файл пишут и другие процессы: version дополнительно растёт, когда меняется
+    PRAGMA data_version на отдельном соединении-наблюдателе, то есть после чужого commit.
+    Соединения открываются при первом обращении, а не при создании пула. close() и configure()
+    увеличивают поколение пула: читатели прежнего поколения переоткрываются в своих потоках.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, shared: bool = False):
+        self.db_path = db_path
+        self.shared = shared
+        self._trace_callback = None
+        self._orphaned = []
+        self._reset()
+        self._generation = 0
+        self._version = 0
+        self.modified_at = time.time()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+
+    def _reset(self) -> None:
+        """Забывает соединения и блокировки: после fork дочерний процесс открывает свои.
+
+        Унаследованные соединения не закрываются (закрытие может сделать checkpoint WAL
+        от имени чужого процесса), а только удерживаются от сборки мусора.
+        """
+        local = getattr(self, '_local', None)
+        for conn in (getattr(self, '_writer', None), getattr(self, '_watcher', None), getattr(local, 'conn', None)):
+            if conn is not None:
+                self._orphaned.append(conn)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._version_lock = threading.Lock()
+        self._watcher = None
+        self._data_version = None
+
+
+    def configure(self, db_path: str) -> None:
+        """Переключает пул на другой файл БД; ':memory:' - общая для всех соединений процесса БД в памяти."""
+        self.close()
+        self.db_path = db_path
+        # Кеши поверх БД привязаны к version: после смены файла они не должны отдавать старые данные
+        self._data_version = None
+        self.bump_version()
+
+
+    @property
+    def in_memory(self) -> bool:
+        return self.db_path == MEMORY_DB_PATH
+
+
+    def close(self) -> None:
+        """Закрывает писателя, наблюдателя и соединение-читатель текущего потока; читатели других потоков
+        закрываются при их следующем обращении к reader()."""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._version_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+        self._generation += 1
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+
+    @property
+    def version(self) -> int:
+        if self.shared:
+            self._check_data_version()
+        return self._version
+
+
+    def _check_data_version(self) -> None:
+        with self._version_lock:
+            if self._watcher is None:
+                self._watcher = self._connect(read_only=True, traced=False)
+            data_version = self._watcher.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                if self._data_version is not None:
+                    self.modified_at = time.time()
+                    self._version += 1
+                self._data_version = data_version
+
+
+    def _connect(self, read_only: bool = False, traced: bool = True) -> sqlite3.Connection:
+        if self.in_memory:
+            # Обычный ':memory:' у каждого соединения свой: потоки должны видеть одну БД через общий кеш
+            # Поколение в имени: незакрытые читатели прежнего поколения не удерживают для нового старую БД
+            conn = sqlite3.connect(f'file:exchange_rates_{id(self)}_{self._generation}?mode=memory&cache=shared',
+                                   check_same_thread=False, uri=True)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute('PRAGMA foreign_keys = ON;')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON;')
+            if self.in_memory:
+                # В общем кеше блокировки табличные: без этого чтение во время записи падает с "table is locked"
+                conn.execute('PRAGMA read_uncommitted = ON;')
+        if traced and self._trace_callback is not None:
+            conn.set_trace_callback(self._trace_callback)
+        return conn
+
+
+    def set_trace_callback(self, callback) -> None:
+        """Колбэк на каждый SQL-запрос для соединений, открываемых после вызова, и для писателя."""
+        self._trace_callback = callback
+        if self._writer is not None:
+            self._writer.set_trace_callback(callback)
+
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.generation != self._generation:
+            conn.close()
+            conn = None
+        if conn is None:
+            self._local.generation = self._generation
+            conn = self._local.conn = self._connect(read_only=True)
+        return conn
+
+
+    def bump_version(self) -> int:
+        with self._version_lock:
+            self.modified_at = time.time()
+            self._version += 1
+            return self._version
+
+
+    @contextmanager
+    def writer(self):
+        """Транзакция на единственном соединении-писателе: commit при успехе, rollback при ошибке."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+
+pool = ConnectionPool()
 
 
-connection = sqlite3.connect(DB_PATH, check_same_thread=False)
+class DatabaseInitializer:
+    def __init__(self, pool = pool):
+        self.pool = pool
 
-connection.row_factory = sqlite3.Row
 
-connection.execute('PRAGMA journal_mode=WAL;')  
-connection.execute('PRAGMA synchronous=NORMAL;')  
-connection.execute('PRAGMA foreign_keys = ON;')
+    def migrate(self) -> List[str]:
+        """Доводит схему до последней версии; возвращает описания применённых миграций."""
+        with self.pool.writer() as conn:
+            return migrate(conn)
 
 
-class DatabaseInitializer:
-    def __init__(self, conn = connection):
-        self.conn = conn
-
-    def create_tables(self):
-        try:
-            with self.conn as conn:
-                cursor = conn.cursor()
-                
-
-                cursor.execute("PRAGMA foreign_keys = ON;")
-
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS Currencies (
-                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                        Code VARCHAR NOT NULL,
-                        FullName VARCHAR NOT NULL,
-                        Sign VARCHAR NOT NULL
-                    )
-                ''')
-
-
-                cursor.execute('''
-                    CREATE UNIQUE INDEX IF NOT EXISTS idx_currencies_code 
-                    ON Currencies (Code)
-                ''')
-
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS ExchangeRates (
-                        ID INTEGER PRIMARY KEY AUTOINCREMENT,
-                        BaseCurrencyId INTEGER NOT NULL,
-                        TargetCurrencyId INTEGER NOT NULL,
-                        Rate DECIMAL(10, 6) NOT NULL,
-                        FOREIGN KEY (BaseCurrencyId) REFERENCES Currencies (ID),
-                        FOREIGN KEY (TargetCurrencyId) REFERENCES Currencies (ID),
-                        UNIQUE (BaseCurrencyId, TargetCurrencyId) -- Чтобы не было дублей одной пары
-                    )
-                ''')
-
-                conn.commit()
-                print("База данных успешно инициализирована.")
-                
-        except sqlite3.Error as e:
-            print(f"Ошибка при инициализации базы данных: {e}")
\ No newline at end of file
+    def warm_up(self) -> None:
+        """Обновляет статистику планировщика: полный ANALYZE, если её ещё нет, иначе PRAGMA optimize."""
+        with self.pool.writer() as conn:
+            has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+            conn.execute('PRAGMA optimize' if has_stats else 'ANALYZE')
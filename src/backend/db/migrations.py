@@ -0,0 +1,128 @@
+import math
+import sqlite3
+from typing import Callable, List, Tuple
+
+from src.backend.services.money import Money
+
+
+# Миграции применяются по порядку; номер последней применённой хранится в PRAGMA user_version.
+# Базы, созданные до появления миграций, имеют user_version = 0, поэтому шаги идемпотентны.
+# Новые шаги добавляются только в конец списка.
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Cursor], None]]] = []
+
+
+def migration(description: str):
+    def register(step: Callable[[sqlite3.Cursor], None]):
+        MIGRATIONS.append((description, step))
+        return step
+    return register
+
+
+@migration('Таблицы валют и курсов')
+def create_base_tables(cursor: sqlite3.Cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Currencies (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Code VARCHAR NOT NULL,
+            FullName VARCHAR NOT NULL,
+            Sign VARCHAR NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_currencies_code
+        ON Currencies (Code)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ExchangeRates (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            BaseCurrencyId INTEGER NOT NULL,
+            TargetCurrencyId INTEGER NOT NULL,
+            Rate DECIMAL(10, 6) NOT NULL,
+            FOREIGN KEY (BaseCurrencyId) REFERENCES Currencies (ID),
+            FOREIGN KEY (TargetCurrencyId) REFERENCES Currencies (ID),
+            UNIQUE (BaseCurrencyId, TargetCurrencyId) -- Чтобы не было дублей одной пары
+        )
+    ''')
+
+
+@migration('Курс без потерь RateDecimal')
+def add_rate_decimal(cursor: sqlite3.Cursor) -> None:
+    # REAL Rate теряет знаки и не вмещает точный курс; десятичная строка хранит курс как есть
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(ExchangeRates)')]
+    if 'RateDecimal' not in columns:
+        cursor.execute('ALTER TABLE ExchangeRates ADD COLUMN RateDecimal TEXT')
+    updates = []
+    for rate_id, rate in cursor.execute('SELECT ID, Rate FROM ExchangeRates WHERE RateDecimal IS NULL').fetchall():
+        if math.isfinite(float(rate)):
+            updates.append((Money.format_rate(Money.to_decimal(float(rate))), rate_id))
+    cursor.executemany('UPDATE ExchangeRates SET RateDecimal = ? WHERE ID = ?', updates)
+
+
+@migration('Индексы курсов по базовой и целевой валюте')
+def add_currency_indexes(cursor: sqlite3.Cursor) -> None:
+    # Фильтры base=/target= с keyset-пагинацией: записи индекса упорядочены по (валюта, ID)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_exchange_rates_base
+        ON ExchangeRates (BaseCurrencyId)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_exchange_rates_target
+        ON ExchangeRates (TargetCurrencyId)
+    ''')
+
+
+@migration('История курсов')
+def create_history(cursor: sqlite3.Cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ExchangeRateHistory (
+            ExchangeRateId INTEGER NOT NULL,
+            Timestamp INTEGER NOT NULL, -- Unix-время в миллисекундах
+            Rate DECIMAL(10, 6) NOT NULL,
+            RateDecimal TEXT,
+            PRIMARY KEY (ExchangeRateId, Timestamp),
+            FOREIGN KEY (ExchangeRateId) REFERENCES ExchangeRates (ID)
+        ) WITHOUT ROWID
+    ''')
+    # Стартовая точка истории для курсов, записанных до появления таблицы
+    cursor.execute('''
+        INSERT OR IGNORE INTO ExchangeRateHistory (ExchangeRateId, Timestamp, Rate, RateDecimal)
+        SELECT er.ID, CAST(strftime('%s', 'now') AS INTEGER) * 1000, er.Rate, er.RateDecimal
+        FROM ExchangeRates er
+        WHERE NOT EXISTS (SELECT 1 FROM ExchangeRateHistory h WHERE h.ExchangeRateId = er.ID)
+    ''')
+
+
+@migration('Журнал событий курсов')
+def create_rate_events(cursor: sqlite3.Cursor) -> None:
+    # Общий для всех процессов источник событий /exchangeRates/stream; ID - id события SSE
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS RateEvents (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            ExchangeRateId INTEGER NOT NULL,
+            BaseCurrencyId INTEGER NOT NULL,
+            TargetCurrencyId INTEGER NOT NULL,
+            Rate DECIMAL(10, 6) NOT NULL,
+            RateDecimal TEXT
+        )
+    ''')
+
+
+def migrate(conn: sqlite3.Connection) -> List[str]:
+    """Применяет недостающие миграции, каждую в своей транзакции. Возвращает описания применённых."""
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    if current > len(MIGRATIONS):
+        raise RuntimeError(f'Схема БД версии {current} новее приложения (известно миграций: {len(MIGRATIONS)})')
+    applied = []
+    for version, (description, step) in enumerate(MIGRATIONS[current:], start=current + 1):
+        cursor = conn.cursor()
+        # Явный BEGIN: иначе sqlite3 выполняет DDL вне транзакции и сбой оставит миграцию применённой наполовину
+        cursor.execute('BEGIN')
+        try:
+            step(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(description)
+    return applied
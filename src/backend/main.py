@@ -1,18 +1,167 @@
-from http.server import HTTPServer
+import argparse
+import logging
+import signal
+import threading
+import time
+from typing import Dict
 
-from src.backend.controller.server import SimpleHandler
- 
-from src.backend.db.init_db import DatabaseInitializer
+from src.backend.controller.pooled_server import DetachableHTTPServer, PooledHTTPServer
+from src.backend.controller.prefork import PreforkSupervisor
+from src.backend.controller.server import SimpleHandler, exchange_repo, warm_up_caches
+from src.backend.db.init_db import DB_PATH, MEMORY_DB_PATH, DatabaseInitializer, pool
+from src.backend.services.admission import admission
+from src.backend.services.metrics import metrics
+from src.backend.services.money import ROUNDING_MODES, money
 
 
-initializer = DatabaseInitializer()
-initializer.create_tables()
+logger = logging.getLogger(__name__)
+
+
+def create_app(db_path: str = DB_PATH, warm_up: bool = False) -> Dict[str, float]:
+    """Подготавливает БД и кеши к приёму запросов; возвращает длительность этапов в секундах.
+
+    Импорт модулей приложения к БД не обращается: соединения открываются здесь или при первом запросе.
+    """
+    timings = {}
+    started = time.perf_counter()
+    pool.configure(db_path)
+    initializer = DatabaseInitializer(pool)
+    for description in initializer.migrate():
+        logger.info('Применена миграция: %s', description)
+    timings['migrations'] = time.perf_counter() - started
+    if warm_up:
+        stage = time.perf_counter()
+        initializer.warm_up()
+        warm_up_caches()
+        timings['warm_up'] = time.perf_counter() - stage
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+
+def non_negative_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'ожидается целое число, получено {value!r}')
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'ожидается неотрицательное число, получено {value!r}')
+    return number
+
+
+def currency_precisions(value: str) -> Dict[str, int]:
+    """JPY=0,BTC=8 -> {'JPY': 0, 'BTC': 8}."""
+    precisions = {}
+    for item in value.split(','):
+        if not item:
+            continue
+        code, separator, digits = item.partition('=')
+        if not separator or len(code) != 3 or not code.isalpha() or not code.isupper():
+            raise argparse.ArgumentTypeError(f'ожидается КОД=ЗНАКИ, например JPY=0, получено {item!r}')
+        precisions[code] = non_negative_int(digits)
+    return precisions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Сервер обмена валют')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--db', default=DB_PATH,
+                        help='путь к файлу SQLite; :memory: - БД в памяти процесса (без --processes)')
+    parser.add_argument('--warm-up', action='store_true',
+                        help='до приёма запросов загрузить кеши и обновить статистику SQLite (ANALYZE / PRAGMA optimize)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='число потоков-обработчиков; 1 - однопоточный сервер')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='число рабочих процессов на общем сокете (pre-fork); 1 - без fork. '
+                             'Счётчики /metrics и лимиты --rate-limit, --write-concurrency, --bulk-concurrency '
+                             'действуют в каждом процессе отдельно')
+    parser.add_argument('--max-queue', type=int, default=None,
+                        help='сколько запросов может ждать свободного потока; сверх - 503 (для --workers > 1)')
+    parser.add_argument('--max-queue-wait-ms', type=float, default=None,
+                        help='запрос, прождавший в очереди дольше, получает 503 (для --workers > 1)')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='запросов в секунду с одного адреса клиента; сверх - 429')
+    parser.add_argument('--rate-burst', type=float, default=None,
+                        help='допустимый всплеск сверх --rate-limit, запросов (по умолчанию равен --rate-limit)')
+    parser.add_argument('--write-concurrency', type=int, default=None,
+                        help='одновременных запросов POST/PATCH; сверх - 503 (по умолчанию без лимита)')
+    parser.add_argument('--bulk-concurrency', type=int, default=None,
+                        help='одновременных пакетных запросов (/exchangeRates/bulk, /exchange/batch); '
+                             'по умолчанию четверть --workers')
+    parser.add_argument('--group-commit', action='store_true',
+                        help='писать курсы через фоновый писатель, объединяя записи из разных запросов в одну транзакцию')
+    parser.add_argument('--group-commit-ms', type=float, default=0.0,
+                        help='сколько миллисекунд дополнительно копить пакет после первой записи; 0 - пакет из того, '
+                             'что накопилось за прошлый commit (для --group-commit)')
+    parser.add_argument('--group-commit-rows', type=int, default=256,
+                        help='максимум записей в пакете (для --group-commit)')
+    parser.add_argument('--slow-request-ms', type=float, default=None,
+                        help='логировать запросы дольше порога в миллисекундах')
+    parser.add_argument('--exact-money', action='store_true',
+                        help='точная арифметика Decimal, суммы и курсы в JSON строками')
+    parser.add_argument('--default-precision', type=non_negative_int, default=2,
+                        help='знаков после запятой в суммах по умолчанию (для --exact-money)')
+    parser.add_argument('--currency-precision', type=currency_precisions, default={},
+                        help='точность по валютам, например JPY=0,BTC=8 (для --exact-money)')
+    parser.add_argument('--rounding', default='ROUND_HALF_EVEN', choices=ROUNDING_MODES, metavar='ROUNDING',
+                        help='режим округления decimal: %s (для --exact-money)' % ', '.join(ROUNDING_MODES))
+    args = parser.parse_args()
+    if args.db == MEMORY_DB_PATH and args.processes > 1:
+        parser.error('БД в памяти не разделяется между процессами: --db :memory: нельзя сочетать с --processes')
+    return args
+
+
+def build_server(args, sock=None):
+    if args.workers > 1:
+        server_class, kwargs = PooledHTTPServer, {
+            'workers': args.workers, 'max_queue': args.max_queue,
+            'max_queue_wait': args.max_queue_wait_ms / 1000 if args.max_queue_wait_ms is not None else None,
+        }
+    else:
+        server_class, kwargs = DetachableHTTPServer, {}
+    if sock is not None:
+        return server_class.from_socket(sock, SimpleHandler, **kwargs)
+    return server_class((args.host, args.port), SimpleHandler, **kwargs)
+
+
+def serve_worker(args, sock):
+    """Рабочий процесс pre-fork режима: SIGTERM останавливает приём и дожидается текущих запросов."""
+    server = build_server(args, sock)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
 
 
 if __name__ == '__main__':
-    server = HTTPServer(('localhost', 8000), SimpleHandler)
-    print("Сервер запущен на http://localhost:8000")
-    server.serve_forever()
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    money.configure(args.exact_money, args.default_precision, args.currency_precision, args.rounding)
+    if args.slow_request_ms is not None:
+        metrics.slow_request_seconds = args.slow_request_ms / 1000
+    # Пакетные запросы держат поток и писателя дольше остальных: они не должны занять весь пул
+    bulk_concurrency = args.bulk_concurrency if args.bulk_concurrency is not None else max(1, args.workers // 4)
+    admission.configure(args.rate_limit, args.rate_burst, {'write': args.write_concurrency, 'bulk': bulk_concurrency})
+    if args.group_commit:
+        exchange_repo.enable_group_commit(args.group_commit_rows, args.group_commit_ms / 1000)
+    timings = create_app(args.db, args.warm_up)
+    print('Запуск занял %.1f мс (%s)' % (timings['total'] * 1000, ', '.join(
+        f'{stage}: {seconds * 1000:.1f} мс' for stage, seconds in timings.items() if stage != 'total')), flush=True)
+    if args.processes > 1:
+        # Соединения родителя не должны переходить в дочерние процессы; кеши следят за чужими записями
+        pool.close()
+        pool.shared = True
+        supervisor = PreforkSupervisor((args.host, args.port), args.processes, lambda sock: serve_worker(args, sock))
+        logger.info('Метрики /metrics и лимиты допуска считаются в каждом процессе отдельно: '
+                    '/metrics показывает процесс, принявший запрос, а лимит на клиента действует до %d раз мягче',
+                    args.processes)
+        print(f"Сервер запущен на http://{args.host}:{args.port} (процессов: {args.processes}, потоков: {args.workers})", flush=True)
+        supervisor.run()
+    else:
+        server = build_server(args)
+        print(f"Сервер запущен на http://{args.host}:{args.port} (потоков: {args.workers})")
+        server.serve_forever()
     
     
-#   python -m src.backend.main
\ No newline at end of file
+#   python -m src.backend.main
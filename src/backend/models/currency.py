@@ -0,0 +1,17 @@
+from typing import Any, Dict
+
+
+class Currency:
+    """Валюта из справочника. as_dict - готовое JSON-представление, общее для всех ответов: его не изменяют."""
+
+    __slots__ = ('id', 'name', 'code', 'sign', 'as_dict')
+
+    def __init__(self, id: int, name: str, code: str, sign: str):
+        self.id = id
+        self.name = name
+        self.code = code
+        self.sign = sign
+        self.as_dict: Dict[str, Any] = {'id': id, 'name': name, 'code': code, 'sign': sign}
+
+    def __repr__(self) -> str:
+        return f'Currency({self.id}, {self.code!r})'
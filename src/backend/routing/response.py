@@ -0,0 +1,91 @@
+import email.utils
+import time
+from http import HTTPStatus
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def header_block(*headers: Tuple[str, str]) -> bytes:
+    """Готовый блок заголовков: собирается один раз при импорте, а не на каждый ответ."""
+    return ''.join(f'{name}: {value}\r\n' for name, value in headers).encode('latin-1')
+
+
+CORS_HEADERS = header_block(
+    ('Access-Control-Allow-Origin', '*'),#
+    ('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS'),#
+    ('Access-Control-Allow-Headers', 'Content-Type'),#
+)
+HTML_HEADERS = header_block(('Content-type', 'text/html')) + CORS_HEADERS
+ERROR_HEADERS = header_block(
+    ('Content-type', 'application/json'),
+    ('Access-Control-Allow-Origin', '*'),#
+)
+# Общая часть ответов с кешируемым телом; Content-type добавляется по согласованному формату
+CACHE_HEADERS = header_block(
+    ('Cache-Control', 'no-cache'),
+    ('Vary', 'Accept, Accept-Encoding'),
+    ('Access-Control-Allow-Origin', '*'),#
+    ('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS'),#
+    ('Access-Control-Allow-Headers', 'Content-Type, If-None-Match'),#
+    ('Access-Control-Expose-Headers', 'ETag, Last-Modified'),#
+)
+NEGOTIATED_HEADERS = header_block(('Vary', 'Accept, Accept-Encoding')) + CORS_HEADERS
+STREAM_JSON_HEADERS = header_block(
+    ('Content-type', 'application/json'),
+    ('Access-Control-Allow-Origin', '*'),#
+    ('Access-Control-Expose-Headers', 'X-Next-Cursor, Link'),#
+)
+EVENT_STREAM_HEADERS = header_block(
+    ('Content-type', 'text/event-stream; charset=utf-8'),
+    ('Cache-Control', 'no-cache'),
+    ('Access-Control-Allow-Origin', '*'),#
+)
+METRICS_HEADERS = header_block(('Content-type', 'text/plain; version=0.0.4; charset=utf-8'))
+OPTIONS_HEADERS = header_block(
+    ('Access-Control-Allow-Origin', '*'),#
+    ('Access-Control-Allow-Methods', 'GET, POST, PATCH, OPTIONS'),#
+    ('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, Last-Event-ID'),#
+)
+CONNECTION_CLOSE = b'Connection: close\r\n'
+CHUNKED = b'Transfer-Encoding: chunked\r\n'
+
+_status_lines: Dict[int, bytes] = {}
+_date_header: Tuple[int, bytes] = (0, b'')
+
+
+def status_line(code: int) -> bytes:
+    line = _status_lines.get(code)
+    if line is None:
+        try:
+            phrase = HTTPStatus(code).phrase
+        except ValueError:
+            phrase = ''
+        line = _status_lines[code] = f'HTTP/1.1 {code} {phrase}\r\n'.encode('latin-1')
+    return line
+
+
+def date_header() -> bytes:
+    """Заголовок Date; форматируется не чаще раза в секунду."""
+    global _date_header
+    now = int(time.time())
+    second, header = _date_header
+    if second != now:
+        header = f'Date: {email.utils.formatdate(now, usegmt=True)}\r\n'.encode('latin-1')
+        _date_header = (now, header)
+    return header
+
+
+def build_head(code: int, server_header: bytes, headers: bytes,
+               extra: Optional[Iterable[Tuple[str, str]]] = None, close: bool = False,
+               length: Optional[int] = None, chunked: bool = False) -> bytes:
+    """Строка статуса и все заголовки ответа одним bytes-объектом, включая пустую строку в конце."""
+    parts = [status_line(code), server_header, date_header(), headers]
+    if extra:
+        parts.append(header_block(*extra))
+    if close:
+        parts.append(CONNECTION_CLOSE)
+    if chunked:
+        parts.append(CHUNKED)
+    elif length is not None:
+        parts.append(b'Content-Length: %d\r\n' % length)
+    parts.append(b'\r\n')
+    return b''.join(parts)
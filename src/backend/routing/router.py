@@ -0,0 +1,128 @@
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+def currency_code(value: str) -> Optional[str]:
+    return value if len(value) == 3 and value.isupper() else None
+
+
+def currency_pair(value: str) -> Optional[str]:
+    return value if len(value) == 6 and value.isupper() else None
+
+
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'str': lambda value: value or None,
+    'currency': currency_code,
+    'pair': currency_pair,
+}
+
+PARAM_PATTERN = re.compile(r'^\{(\w+)(?::(\w+))?\}$')
+
+
+class Route(NamedTuple):
+    method: str
+    pattern: str
+    label: str
+    handler: Callable
+    group: str
+
+
+class _Node:
+    __slots__ = ('children', 'param', 'routes', 'errors')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.param: Optional[Tuple[str, Callable[[str], Any], '_Node']] = None
+        self.routes: Dict[str, Route] = {}
+        self.errors: Dict[str, str] = {}
+
+
+class Router:
+    """Таблица маршрутов, собранная один раз при старте.
+
+    Статические пути ищутся по словарю, пути с параметрами - по дереву сегментов.
+    Параметры типизированы: {code:currency}, {pair:pair}; значение, не прошедшее проверку типа,
+    означает несовпадение маршрута. Если задан error, путь под общим префиксом маршрута,
+    который ни с чем не совпал, даёт ValueError с этим сообщением (ответ 400) вместо 404.
+    group - группа маршрута для лимитов одновременных запросов: по умолчанию read для GET и write для остальных.
+    """
+
+    def __init__(self):
+        self._static: Dict[str, Dict[str, Route]] = {}
+        self._tree = _Node()
+        self.routes: List[Route] = []
+
+
+    def route(self, method: str, pattern: str, error: Optional[str] = None, group: Optional[str] = None) -> Callable:
+        """Декоратор метода обработчика: регистрирует его на method + pattern."""
+        def decorator(handler: Callable) -> Callable:
+            self.add(method, pattern, handler, error, group)
+            return handler
+        return decorator
+
+
+    def add(self, method: str, pattern: str, handler: Callable, error: Optional[str] = None,
+            group: Optional[str] = None) -> Route:
+        segments = pattern.strip('/').split('/') if pattern != '/' else []
+        label_parts = []
+        node = self._tree
+        error_node = None
+        for segment in segments:
+            match = PARAM_PATTERN.match(segment)
+            if match is None:
+                label_parts.append(segment)
+                node = node.children.setdefault(segment, _Node())
+                continue
+            name, type_name = match.group(1), match.group(2) or 'str'
+            if type_name not in CONVERTERS:
+                raise ValueError(f'Неизвестный тип параметра маршрута: {type_name}')
+            label_parts.append('{%s}' % name)
+            if error_node is None:
+                error_node = node
+            if node.param is None:
+                node.param = (name, CONVERTERS[type_name], _Node())
+            elif node.param[0] != name:
+                raise ValueError(f'Конфликт параметров маршрута {pattern}: {node.param[0]} и {name}')
+            node = node.param[2]
+        route = Route(method, pattern, '/' + '/'.join(label_parts), handler,
+                      group or ('read' if method == 'GET' else 'write'))
+        if error_node is None:
+            self._static.setdefault(route.label, {})[method] = route
+        else:
+            node.routes[method] = route
+            if error is not None:
+                error_node.errors[method] = error
+        self.routes.append(route)
+        return route
+
+
+    def match(self, method: str, path: str) -> Optional[Tuple[Route, Dict[str, Any]]]:
+        routes = self._static.get(path)
+        if routes is not None:
+            route = routes.get(method)
+            return (route, {}) if route is not None else None
+
+        params = {}
+        node = self._tree
+        error = None
+        for segment in path[1:].split('/'):
+            error = node.errors.get(method, error)
+            child = node.children.get(segment)
+            if child is not None:
+                node = child
+                continue
+            if node.param is not None:
+                name, convert, child = node.param
+                value = convert(segment)
+                if value is not None:
+                    params[name] = value
+                    node = child
+                    continue
+            node = None
+            break
+        route = node.routes.get(method) if node is not None else None
+        if route is None:
+            if error is not None:
+                raise ValueError(error)
+            return None
+        return route, params
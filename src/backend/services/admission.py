@@ -0,0 +1,104 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from src.backend.services.metrics import metrics
+
+
+class Rejected(Exception):
+    """Запрос отклонён до обработки: ответ status с заголовком Retry-After (секунды)."""
+
+    def __init__(self, status: int, message: str, retry_after: int, reason: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucketLimiter:
+    """Token bucket на каждого клиента: rate запросов в секунду, всплеск до burst.
+
+    Корзины хранятся в словаре по адресу клиента; когда их больше max_clients, полные
+    (давно неактивные) корзины удаляются - они ничем не отличаются от новой.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+
+
+    def acquire(self, client: str) -> float:
+        """Забирает токен: 0, если запрос разрешён, иначе сколько секунд ждать следующего токена."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._evict(now)
+                bucket = self._buckets[client] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / self.rate
+
+
+    def _evict(self, now: float) -> None:
+        full_after = self.burst / self.rate
+        self._buckets = {client: bucket for client, bucket in self._buckets.items() if now - bucket[1] < full_after}
+
+
+class AdmissionControl:
+    """Допуск запросов к обработке: лимит частоты на клиента и лимит одновременных запросов на группу маршрутов.
+
+    Группы задаются маршрутам в роутере (read, write, bulk). Для группы без лимита семафор
+    не заводится. Отказ не ждёт освобождения места, а сразу поднимает Rejected: клиент
+    получает 429 или 503 с Retry-After, а потоки сервера не копят очередь.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.limiter: Optional[TokenBucketLimiter] = None
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                  group_limits: Optional[Dict[str, Optional[int]]] = None) -> None:
+        self.limiter = TokenBucketLimiter(rate, burst) if rate else None
+        self._semaphores = {group: threading.BoundedSemaphore(limit)
+                            for group, limit in (group_limits or {}).items() if limit}
+
+
+    @contextmanager
+    def admit(self, client: str, group: str, route: str):
+        if self.limiter is not None:
+            wait = self.limiter.acquire(client)
+            if wait:
+                self._reject(route, Rejected(429, 'Слишком много запросов, повторите позже',
+                                             math.ceil(wait), 'rate_limit'))
+        semaphore = self._semaphores.get(group)
+        if semaphore is None:
+            yield
+            return
+        if not semaphore.acquire(blocking=False):
+            self._reject(route, Rejected(503, 'Сервер перегружен, повторите позже', 1, 'concurrency'))
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+    def _reject(self, route: str, rejected: Rejected) -> None:
+        if self.metrics is not None:
+            self.metrics.count_rejection(rejected.reason, route)
+        raise rejected
+
+
+admission = AdmissionControl(metrics)
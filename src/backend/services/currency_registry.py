@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from src.backend.db.init_db import pool
+from src.backend.models.currency import Currency
+
+
+class _Index(NamedTuple):
+    by_code: Dict[str, Currency]
+    by_id: Dict[int, Currency]
+    ordered: List[Currency]
+    version: Optional[int]
+    generation: int
+
+
+class CurrencyRegistry:
+    """Справочник валют в памяти с поиском по коду и по ID.
+
+    Загружается из БД при первом обращении и дополняется при add_currency. Промах перечитывает
+    таблицу, только если версия данных пула изменилась с последней загрузки (например, валюту
+    добавил другой процесс), поэтому запросы несуществующих кодов не ходят в БД. После смены
+    файла БД (новое поколение пула) справочник загружается заново.
+    Индекс заменяется целиком, читатели работают без блокировки.
+    """
+
+    def __init__(self, pool = pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._index: Optional[_Index] = None
+
+
+    def load(self) -> None:
+        version, generation = self.pool.version, self.pool.generation
+        cursor = self.pool.reader().cursor()
+        cursor.execute('SELECT ID, FullName, Code, Sign FROM Currencies ORDER BY ID')
+        ordered = [Currency(row['ID'], row['FullName'], row['Code'], row['Sign']) for row in cursor.fetchall()]
+        with self._lock:
+            self._index = _Index({currency.code: currency for currency in ordered},
+                                 {currency.id: currency for currency in ordered}, ordered, version, generation)
+
+
+    def all(self) -> List[Currency]:
+        return self._get_index().ordered
+
+
+    def by_code(self, code: str) -> Optional[Currency]:
+        currency = self._get_index().by_code.get(code)
+        if currency is None and self._reload_if_stale():
+            currency = self._index.by_code.get(code)
+        return currency
+
+
+    def by_id(self, currency_id: int) -> Optional[Currency]:
+        currency = self._get_index().by_id.get(currency_id)
+        if currency is None and self._reload_if_stale():
+            currency = self._index.by_id.get(currency_id)
+        return currency
+
+
+    def add(self, currency: Currency) -> None:
+        """Добавляет только что записанную в БД валюту без перечитывания таблицы."""
+        self._get_index()
+        with self._lock:
+            index = self._index
+            by_code, by_id = dict(index.by_code), dict(index.by_id)
+            by_code[currency.code] = by_id[currency.id] = currency
+            self._index = _Index(by_code, by_id, sorted(by_id.values(), key=lambda item: item.id),
+                                 index.version, index.generation)
+
+
+    def _get_index(self) -> _Index:
+        index = self._index
+        if index is None or index.generation != self.pool.generation:
+            self.load()
+            index = self._index
+        return index
+
+
+    def _reload_if_stale(self) -> bool:
+        if self._index.version == self.pool.version:
+            return False
+        self.load()
+        return True
+
+
+currency_registry = CurrencyRegistry()
@@ -0,0 +1,135 @@
+import csv
+import gzip
+import io
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CSV = 'text/csv'
+IDENTITY = 'identity'
+
+CONTENT_TYPES = {
+    JSON: 'application/json',
+    MSGPACK: 'application/msgpack',
+    CSV: 'text/csv; charset=utf-8',
+}
+MEDIA_TYPE_ALIASES = {'application/x-msgpack': MSGPACK, 'application/vnd.msgpack': MSGPACK}
+
+# Маленькие тела не сжимаем: заголовок gzip и время на сжатие съедают выигрыш
+MIN_COMPRESS_SIZE = 1024
+
+
+def _encode_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def _encode_msgpack(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _flatten(item: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    flat = {}
+    for key, value in item.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def _encode_csv(data: Any) -> bytes:
+    """Таблица: строка на объект, вложенные объекты разворачиваются в колонки вида baseCurrency.code."""
+    rows = [_flatten(item) for item in (data if isinstance(data, list) else [data])]
+    columns: List[str] = []
+    for row in rows:
+        columns.extend(column for column in row if column not in columns)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns, lineterminator='\r\n')
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {JSON: _encode_json, CSV: _encode_csv}
+if msgpack is not None:
+    ENCODERS[MSGPACK] = _encode_msgpack
+
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=5)
+# mtime=0: одинаковое тело - одинаковые байты и ETag
+COMPRESSORS['gzip'] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+
+ALL_MEDIA_TYPES = tuple(ENCODERS)
+DOCUMENT_MEDIA_TYPES = tuple(media_type for media_type in ENCODERS if media_type != CSV)
+
+
+def parse_quality_list(header: Optional[str]) -> List[Tuple[str, float]]:
+    """Заголовок вида 'a/b;q=0.5, c/d' -> [(значение, q)] без параметров, кроме q."""
+    items = []
+    for part in (header or '').split(','):
+        value, *params = [piece.strip() for piece in part.split(';')]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        items.append((value.lower(), quality))
+    return items
+
+
+def negotiate_media_type(accept: Optional[str], offered: Sequence[str] = ALL_MEDIA_TYPES) -> str:
+    """Лучший из offered по Accept; при равном q побеждает порядок offered. Без совпадений - JSON."""
+    if not accept:
+        return JSON
+    ranges = [(MEDIA_TYPE_ALIASES.get(value, value), quality) for value, quality in parse_quality_list(accept)]
+    best, best_quality = JSON, 0.0
+    for media_type in offered:
+        main_type = media_type.split('/')[0] + '/*'
+        quality, specificity = None, -1
+        for value, range_quality in ranges:
+            rank = 2 if value == media_type else 1 if value == main_type else 0 if value == '*/*' else -1
+            if rank > specificity:
+                quality, specificity = range_quality, rank
+        if quality is not None and quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    """Лучшее доступное сжатие по Accept-Encoding (br, затем gzip при равном q) или identity."""
+    ranges = dict(parse_quality_list(accept_encoding))
+    best, best_quality = IDENTITY, 0.0
+    for encoding in COMPRESSORS:
+        quality = ranges.get(encoding, ranges.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def encode(data: Any, media_type: str) -> bytes:
+    return ENCODERS[media_type](data)
+
+
+def compress(body: bytes, encoding: str) -> Tuple[bytes, str]:
+    """Сжатое тело и фактическое кодирование: маленькие тела остаются как есть."""
+    if encoding == IDENTITY or len(body) < MIN_COMPRESS_SIZE:
+        return body, IDENTITY
+    return COMPRESSORS[encoding](body), encoding
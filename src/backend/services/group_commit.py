@@ -0,0 +1,140 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, Optional
+
+from src.backend.services.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Ошибки отдельной записи: достаются только её вызывающему, остальные записи пакета применяются
+ITEM_ERRORS = (KeyError, ValueError, sqlite3.IntegrityError)
+
+
+class _Pending:
+    __slots__ = ('payload', 'futures')
+
+    def __init__(self, payload: Any, futures: List[Future]):
+        self.payload = payload
+        self.futures = futures
+
+
+class GroupCommitQueue:
+    """Фоновый писатель: записи из многих запросов применяются пакетом в одной транзакции.
+
+    В пакет попадает всё, что накопилось в очереди, пока шёл прошлый commit (не больше max_batch
+    записей). При max_delay > 0 писатель дополнительно ждёт до max_delay секунд с первой записи:
+    это укрупняет пакеты, но при небольшом числе пишущих потоков только добавляет задержку.
+    Записи с одинаковым key внутри пакета схлопываются: применяется последняя, а все их
+    вызывающие получают её результат. Future вызывающего завершается только после commit
+    пакета, поэтому подтверждение по-прежнему означает записанные данные.
+
+    apply(cursor, payload) выполняет одну запись внутри транзакции; after_commit(results)
+    вызывается после commit со списком результатов успешных записей и возвращает значения
+    для их future в том же порядке.
+    """
+
+    def __init__(self, pool, apply: Callable[[sqlite3.Cursor, Any], Any],
+                 after_commit: Optional[Callable[[List[Any]], List[Any]]] = None,
+                 max_batch: int = 256, max_delay: float = 0.0):
+        self.pool = pool
+        self.apply = apply
+        self.after_commit = after_commit
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+
+    def submit(self, payload: Any, key: Optional[Hashable] = None) -> Future:
+        """Ставит запись в очередь; key=None - запись не схлопывается с другими."""
+        future = Future()
+        self._queue.put((key, payload, future))
+        if self._thread is None:
+            self._start()
+        return future
+
+
+    def _start(self) -> None:
+        # Поток создаётся при первой записи: в pre-fork режиме - уже в дочернем процессе
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-group-commit', daemon=True)
+                self._thread.start()
+
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    # Всё, что накопилось за время прошлого commit, забирается сразу, без ожидания
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except BaseException as e:
+                logger.exception('Сбой группового commit')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+    def _commit(self, batch: list) -> None:
+        # Схлопнутая запись встаёт на место последней из своих: она идёт после всего, что ей предшествовало
+        pending = {}
+        for key, payload, future in batch:
+            if key is None:
+                key = object()
+            previous = pending.pop(key, None)
+            pending[key] = _Pending(payload, (previous.futures if previous else []) + [future])
+        items = list(pending.values())
+
+        outcomes = []
+        try:
+            with self.pool.writer() as conn:
+                cursor = conn.cursor()
+                for item in items:
+                    try:
+                        outcomes.append((item, self.apply(cursor, item.payload), None))
+                    except ITEM_ERRORS as e:
+                        outcomes.append((item, None, e))
+        except BaseException as e:
+            for item in items:
+                for future in item.futures:
+                    future.set_exception(e)
+            return
+        metrics.count_group_commit(len(batch), len(items))
+
+        succeeded = [(item, result) for item, result, error in outcomes if error is None]
+        values = [result for _, result in succeeded]
+        if self.after_commit is not None and succeeded:
+            try:
+                values = self.after_commit(values)
+            except BaseException as e:
+                for item, _ in succeeded:
+                    for future in item.futures:
+                        future.set_exception(e)
+                succeeded = []
+        for (item, _), value in zip(succeeded, values):
+            for future in item.futures:
+                future.set_result(value)
+        for item, _, error in outcomes:
+            if error is not None:
+                for future in item.futures:
+                    future.set_exception(error)
@@ -0,0 +1,214 @@
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ENCODE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+QUANTILES = (0.5, 0.95, 0.99)
+# Прочие методы сводятся в одну серию: иначе каждый присланный клиентом метод заводит свою
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+def escape_label(value) -> str:
+    """Значение метки для текстового формата Prometheus: экранируются \\, \" и перевод строки."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин; квантили оцениваются интерполяцией внутри корзины."""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class Metrics:
+    """Счётчики и гистограммы сервера в памяти с выдачей в текстовом формате Prometheus."""
+
+    def __init__(self, slow_request_seconds: Optional[float] = None):
+        self.slow_request_seconds = slow_request_seconds
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests: Dict[Tuple[str, str], Histogram] = {}
+        self._statuses: Dict[Tuple[str, str, int], int] = {}
+        self._dao: Dict[str, list] = {}
+        self._json_encode = Histogram(ENCODE_BUCKETS)
+        self._rejections: Dict[Tuple[str, str], int] = {}
+        self._queue_wait = Histogram(LATENCY_BUCKETS)
+        self._group_commits = [0, 0, 0]
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, path: str = '') -> None:
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        with self._lock:
+            histogram = self._requests.get((method, route))
+            if histogram is None:
+                histogram = self._requests[(method, route)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            key = (method, route, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            logger.warning('Медленный запрос: %s %s -> %s за %.1f мс', method, path or route, status, seconds * 1000)
+
+
+    def observe_json_encode(self, seconds: float) -> None:
+        with self._lock:
+            self._json_encode.observe(seconds)
+
+
+    def count_rejection(self, reason: str, route: str = 'other') -> None:
+        """Запрос отклонён без обработки: rate_limit, concurrency, queue_full или queue_timeout."""
+        with self._lock:
+            key = (reason, route)
+            self._rejections[key] = self._rejections.get(key, 0) + 1
+
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._queue_wait.observe(seconds)
+
+
+    def count_group_commit(self, submitted: int, written: int) -> None:
+        """Групповой commit: submitted записей из очереди, written после схлопывания повторов."""
+        with self._lock:
+            self._group_commits[0] += 1
+            self._group_commits[1] += submitted
+            self._group_commits[2] += written
+
+
+    def add_gauge(self, name: str, description: str, read: Callable[[], float]) -> None:
+        """Показатель, значение которого читается вызовом read в момент выдачи /metrics."""
+        self._gauges[name] = (description, read)
+
+
+    def count_query(self, statement: str) -> None:
+        """trace-callback для sqlite3: считает выполненные запросы текущего потока."""
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+
+    def track_dao(self, func: Callable) -> Callable:
+        """Декоратор метода DAO: число вызовов, время и число SQL-запросов внутри вызова."""
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            queries_before = getattr(local, 'queries', 0)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                queries = getattr(local, 'queries', 0) - queries_before
+                with self._lock:
+                    stats = self._dao.get(name)
+                    if stats is None:
+                        stats = self._dao[name] = [0, 0.0, 0]
+                    stats[0] += 1
+                    stats[1] += elapsed
+                    stats[2] += queries
+        return wrapper
+
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ['# HELP http_requests_total Число обработанных HTTP-запросов.',
+                     '# TYPE http_requests_total counter']
+            for (method, route, status), count in sorted(self._statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{escape_label(route)}",status="{status}"}} {count}')
+
+            lines += ['# HELP http_request_duration_seconds Время обработки HTTP-запроса.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, route), histogram in sorted(self._requests.items()):
+                lines += self._render_histogram('http_request_duration_seconds',
+                                                f'method="{method}",route="{escape_label(route)}"', histogram)
+
+            lines += ['# HELP http_request_duration_quantile_seconds Оценка p50/p95/p99 по гистограмме.',
+                      '# TYPE http_request_duration_quantile_seconds gauge']
+            for (method, route), histogram in sorted(self._requests.items()):
+                for q in QUANTILES:
+                    lines.append(f'http_request_duration_quantile_seconds{{method="{method}",route="{escape_label(route)}",quantile="{q}"}} '
+                                 f'{histogram.quantile(q):.6f}')
+
+            lines += ['# HELP dao_calls_total Число вызовов методов DAO.',
+                      '# TYPE dao_calls_total counter']
+            lines += [f'dao_calls_total{{method="{name}"}} {stats[0]}' for name, stats in sorted(self._dao.items())]
+            lines += ['# HELP dao_duration_seconds_total Суммарное время в методах DAO.',
+                      '# TYPE dao_duration_seconds_total counter']
+            lines += [f'dao_duration_seconds_total{{method="{name}"}} {stats[1]:.6f}' for name, stats in sorted(self._dao.items())]
+            lines += ['# HELP dao_queries_total Число SQL-запросов SQLite внутри методов DAO.',
+                      '# TYPE dao_queries_total counter']
+            lines += [f'dao_queries_total{{method="{name}"}} {stats[2]}' for name, stats in sorted(self._dao.items())]
+
+            lines += ['# HELP json_encode_duration_seconds Время сериализации ответов в JSON.',
+                      '# TYPE json_encode_duration_seconds histogram']
+            lines += self._render_histogram('json_encode_duration_seconds', '', self._json_encode)
+
+            lines += ['# HELP http_rejected_requests_total Запросы, отклонённые без обработки (429/503).',
+                      '# TYPE http_rejected_requests_total counter']
+            lines += [f'http_rejected_requests_total{{reason="{reason}",route="{escape_label(route)}"}} {count}'
+                      for (reason, route), count in sorted(self._rejections.items())]
+            lines += ['# HELP http_queue_wait_seconds Ожидание запроса в очереди пула потоков.',
+                      '# TYPE http_queue_wait_seconds histogram']
+            lines += self._render_histogram('http_queue_wait_seconds', '', self._queue_wait)
+
+            commits, submitted, written = self._group_commits
+            lines += ['# HELP db_group_commits_total Транзакции фонового писателя.',
+                      '# TYPE db_group_commits_total counter',
+                      f'db_group_commits_total {commits}',
+                      '# HELP db_group_commit_writes_total Записи фонового писателя: поступившие и применённые после схлопывания.',
+                      '# TYPE db_group_commit_writes_total counter',
+                      f'db_group_commit_writes_total{{stage="submitted"}} {submitted}',
+                      f'db_group_commit_writes_total{{stage="written"}} {written}']
+            for name, (description, read) in sorted(self._gauges.items()):
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge', f'{name} {read()}']
+        return '\n'.join(lines) + '\n'
+
+
+    @staticmethod
+    def _render_histogram(name: str, labels: str, histogram: Histogram) -> list:
+        prefix = labels + ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {histogram.total:.6f}')
+        lines.append(f'{name}_count{suffix} {histogram.count}')
+        return lines
+
+
+metrics = Metrics()
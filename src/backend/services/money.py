@@ -0,0 +1,133 @@
+import decimal
+import math
+from decimal import Decimal, Context, InvalidOperation, ROUND_HALF_EVEN
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+RATE_EXPONENT = 9
+RATE_QUANTUM = Decimal(1).scaleb(-RATE_EXPONENT)
+DECIMAL_PRECISION = 28
+ROUNDING_MODES = (decimal.ROUND_HALF_EVEN, decimal.ROUND_HALF_UP, decimal.ROUND_HALF_DOWN, decimal.ROUND_UP,
+                  decimal.ROUND_DOWN, decimal.ROUND_CEILING, decimal.ROUND_FLOOR, decimal.ROUND_05UP)
+
+Number = Union[float, Decimal]
+
+
+class Money:
+    """Правила денежной арифметики: float (по умолчанию) или точный режим на Decimal.
+
+    Курсы хранятся без потерь десятичной строкой рядом с REAL-значением. В точном режиме курсы
+    округляются до шага RATE_QUANTUM, курсы и суммы - Decimal, суммы округляются до точности
+    валюты, а в JSON уходят строками. Контекст Decimal создаётся
+    один раз и передаётся в quantize явно, без localcontext на каждый запрос.
+    """
+
+    def __init__(self, exact: bool = False, default_precision: int = 2,
+                 precisions: Optional[Dict[str, int]] = None, rounding: str = ROUND_HALF_EVEN):
+        self.configure(exact, default_precision, precisions, rounding)
+
+
+    def configure(self, exact: bool = False, default_precision: int = 2,
+                  precisions: Optional[Dict[str, int]] = None, rounding: str = ROUND_HALF_EVEN) -> None:
+        self.exact = exact
+        self.default_precision = default_precision
+        self.precisions = dict(precisions or {})
+        self.context = Context(prec=DECIMAL_PRECISION, rounding=rounding)
+        self._quanta: Dict[str, Decimal] = {}
+
+
+    def parse(self, value: Any, name: str) -> Number:
+        """Число из запроса: Decimal в точном режиме, иначе float."""
+        if isinstance(value, bool):
+            raise ValueError(f'Некорректное значение {name}: ожидается число')
+        try:
+            number = self.to_decimal(value) if self.exact else float(value)
+        except (TypeError, ValueError, InvalidOperation, OverflowError):
+            raise ValueError(f'Некорректное значение {name}: ожидается число')
+        if self.exact and not number.is_finite():
+            raise ValueError(f'Некорректное значение {name}: ожидается число')
+        return number
+
+
+    @staticmethod
+    def to_decimal(value: Any) -> Decimal:
+        if isinstance(value, Decimal):
+            return value
+        if isinstance(value, float):
+            # repr даёт кратчайшую запись float, а не его двоичный хвост
+            return Decimal(repr(value))
+        if isinstance(value, str):
+            return Decimal(value.strip())
+        return Decimal(value)
+
+
+    def to_stored(self, rate: Any) -> Tuple[float, Optional[str]]:
+        """Курс -> значения столбцов (Rate, RateDecimal).
+
+        В режиме float курс, как и прежде, не проверяется и сохраняется без потерь (RateDecimal None для
+        inf/nan). В точном режиме курс округляется до RATE_QUANTUM, должен остаться положительным, и оба
+        столбца получают округлённое значение.
+        """
+        try:
+            decimal_rate = self.to_decimal(rate)
+            float_rate = float(decimal_rate if self.exact else rate)
+        except (TypeError, ValueError, InvalidOperation, OverflowError):
+            raise ValueError('Некорректное значение rate: ожидается число')
+        if not self.exact:
+            return float_rate, self.format_rate(decimal_rate) if decimal_rate.is_finite() else None
+        if not decimal_rate.is_finite() or decimal_rate <= 0:
+            raise ValueError('Значение rate должно быть положительным')
+        quantized = self.quantize_rate(decimal_rate)
+        if not quantized:
+            raise ValueError(f'Значение rate меньше шага курса 1e-{RATE_EXPONENT}')
+        if math.isinf(float_rate):
+            raise ValueError('Значение rate слишком велико')
+        return float(quantized), self.format_rate(quantized)
+
+
+    def quantize_rate(self, rate: Decimal) -> Decimal:
+        try:
+            return rate.quantize(RATE_QUANTUM, context=self.context)
+        except InvalidOperation:
+            # Целая часть не оставляет места для 9 знаков после запятой: округляем до точности контекста
+            return self.context.plus(rate)
+
+
+    def round_amount(self, amount: Decimal, code: str) -> Decimal:
+        quantum = self._quanta.get(code)
+        if quantum is None:
+            quantum = self._quanta[code] = Decimal(1).scaleb(-self.precisions.get(code, self.default_precision))
+        try:
+            return amount.quantize(quantum, context=self.context)
+        except InvalidOperation:
+            # Сумма с точностью валюты не помещается в DECIMAL_PRECISION знаков
+            raise ValueError('Сумма слишком велика для точного расчёта')
+
+
+    def stored_rate(self, rate: float, decimal_rate: Optional[str]) -> Decimal:
+        """Decimal курса из строки ExchangeRates: RateDecimal, а для старых строк - Rate через repr."""
+        return Decimal(decimal_rate) if decimal_rate is not None else self.to_decimal(rate)
+
+
+    def rate_value(self, rate: float, decimal_rate: Optional[str]) -> Any:
+        """Значение rate для JSON: как в БД в режиме float, строкой из RateDecimal в точном режиме."""
+        if not self.exact:
+            return rate
+        return self.format_rate(self.stored_rate(rate, decimal_rate))
+
+
+    @staticmethod
+    def format_rate(rate: Decimal) -> str:
+        text = format(rate, 'f')
+        if '.' in text:
+            text = text.rstrip('0').rstrip('.')
+        return text
+
+
+    @staticmethod
+    def serialize(value: Any) -> Any:
+        """Decimal -> строка в фиксированной записи (с хвостовыми нулями точности валюты); прочее как есть."""
+        return format(value, 'f') if isinstance(value, Decimal) else value
+
+
+money = Money()
@@ -0,0 +1,225 @@
+import json
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateEventBroker:
+    """Рассылка изменений курсов подписчикам Server-Sent Events.
+
+    Все подписчики обслуживаются одним потоком на selectors: сокеты неблокирующие,
+    поэтому тысячи простаивающих соединений не занимают по потоку каждое.
+    События берутся из общей для всех процессов таблицы RateEvents (load_events) и id события -
+    её ID: в pre-fork режиме подписчик получает записи всех процессов, а Last-Event-ID досылается
+    из неё же. Поток опрашивает таблицу каждые POLL_SECONDS, а после записи в своём процессе
+    (notify) - сразу.
+    """
+
+    HEARTBEAT_SECONDS = 15
+    POLL_SECONDS = 0.1
+    MAX_BUFFERED_BYTES = 1024 * 1024
+
+    def __init__(self, load_events: Callable[[int, int], List[Tuple[int, Dict[str, Any]]]],
+                 last_event_id: Callable[[], int], history_size: int = 1000):
+        self.load_events = load_events
+        self.last_event_id = last_event_id
+        self.history_size = history_size
+        self._last_id = None
+        self._lock = threading.Lock()
+        self._pending_subscribers = []
+        self._subscribers: Dict[socket.socket, bytearray] = {}
+        self._selector = None
+        self._wake_reader, self._wake_writer = None, None
+        self._thread = None
+
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+    def notify(self) -> None:
+        """Курсы записаны в этом процессе: новые события забираются без ожидания опроса."""
+        if self._thread is not None:
+            self._wake()
+
+
+    def subscribe(self, sock: socket.socket, last_event_id: Optional[str] = None) -> None:
+        """Забирает сокет с уже отправленными заголовками ответа; пропущенные события досылает поток рассылки."""
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_id = None
+        with self._lock:
+            self._ensure_started()
+            self._pending_subscribers.append((sock, last_id))
+        self._wake()
+
+
+    def _read_events(self, after_id: int, up_to: Optional[int] = None) -> Tuple[bytes, int]:
+        """Сообщения SSE для событий с ID из (after_id, up_to] и ID последнего из них."""
+        messages = []
+        while True:
+            events = self.load_events(after_id, self.history_size)
+            for event_id, data in events:
+                if up_to is not None and event_id > up_to:
+                    return b''.join(messages), after_id
+                payload = json.dumps(data, ensure_ascii=False)
+                messages.append(f'id: {event_id}\nevent: rate\ndata: {payload}\n\n'.encode('utf-8'))
+                after_id = event_id
+            if len(events) < self.history_size:
+                return b''.join(messages), after_id
+
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            self._selector = selectors.DefaultSelector()
+            self._wake_reader, self._wake_writer = socket.socketpair()
+            self._wake_reader.setblocking(False)
+            self._wake_writer.setblocking(False)
+            self._selector.register(self._wake_reader, selectors.EVENT_READ)
+            self._thread = threading.Thread(target=self._run, name='rate-events', daemon=True)
+            self._thread.start()
+
+
+    def _wake(self) -> None:
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+
+    def _run(self) -> None:
+        last_heartbeat = time.monotonic()
+        while True:
+            try:
+                last_heartbeat = self._run_once(last_heartbeat)
+            except Exception:
+                # Поток один на процесс: сбой одной итерации не должен останавливать рассылку
+                logger.exception('Сбой рассылки событий курсов')
+                time.sleep(self.POLL_SECONDS)
+
+
+    def _run_once(self, last_heartbeat: float) -> float:
+        """Один проход цикла рассылки; возвращает время последнего heartbeat."""
+        for key, mask in self._selector.select(timeout=self.POLL_SECONDS if self._subscribers else self.HEARTBEAT_SECONDS):
+            if key.fileobj is self._wake_reader:
+                self._drain_wake()
+                continue
+            sock = key.fileobj
+            if mask & selectors.EVENT_READ and not self._read_client(sock):
+                continue
+            if mask & selectors.EVENT_WRITE:
+                self._flush(sock)
+
+        with self._lock:
+            subscribers, self._pending_subscribers = self._pending_subscribers, []
+        if subscribers and not self._subscribers:
+            # Без подписчиков таблица не читается: ID, запомненный до простоя, устарел
+            self._last_id = None
+        for sock, last_id in subscribers:
+            buffer = bytearray(b'retry: 3000\n\n')
+            if last_id is not None:
+                buffer += self._replay(last_id)
+            try:
+                sock.setblocking(False)
+                self._selector.register(sock, selectors.EVENT_READ)
+            except (OSError, ValueError):
+                sock.close()
+                continue
+            self._subscribers[sock] = buffer
+        message = self._poll()
+        if time.monotonic() - last_heartbeat >= self.HEARTBEAT_SECONDS:
+            message += b': ping\n\n'
+            last_heartbeat = time.monotonic()
+        for sock, buffer in list(self._subscribers.items()):
+            if message:
+                buffer += message
+            if len(buffer) > self.MAX_BUFFERED_BYTES:
+                # Медленный клиент: отключаем, он переподключится с Last-Event-ID
+                self._close(sock)
+            elif buffer:
+                self._flush(sock)
+        return last_heartbeat
+
+
+    def _poll(self) -> bytes:
+        """Новые события для всех подписчиков; без подписчиков таблица не читается."""
+        if not self._subscribers:
+            return b''
+        try:
+            if self._last_id is None:
+                # Новый подписчик без Last-Event-ID получает события с текущего момента
+                self._last_id = self.last_event_id()
+                return b''
+            message, self._last_id = self._read_events(self._last_id)
+            return message
+        except Exception:
+            logger.exception('Не удалось прочитать события курсов')
+            return b''
+
+
+    def _replay(self, last_id: int) -> bytes:
+        """События после Last-Event-ID до уже разосланного ID, не больше history_size последних."""
+        try:
+            if self._last_id is None:
+                self._last_id = self.last_event_id()
+            return self._read_events(max(last_id, self._last_id - self.history_size), self._last_id)[0]
+        except Exception:
+            logger.exception('Не удалось прочитать события курсов')
+            return b''
+
+
+    def _drain_wake(self) -> None:
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+
+    def _read_client(self, sock: socket.socket) -> bool:
+        try:
+            if sock.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._close(sock)
+        return False
+
+
+    def _flush(self, sock: socket.socket) -> None:
+        buffer = self._subscribers.get(sock)
+        if buffer is None:
+            return
+        try:
+            sent = sock.send(buffer)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._close(sock)
+            return
+        del buffer[:sent]
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if buffer else selectors.EVENT_READ
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events)
+
+
+    def _close(self, sock: socket.socket) -> None:
+        self._subscribers.pop(sock, None)
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,65 @@
+from collections import deque
+from typing import Callable, Dict, Any, Iterable, Optional, Tuple
+
+
+class RateGraph:
+    """Граф валют в памяти: вершины - коды валют, рёбра - прямые и обратные курсы.
+
+    Курс между любыми двумя валютами ищется кратчайшим (по числу переходов) путём.
+    Лучшие курсы от валюты-источника считаются один раз и переиспользуются до пересборки графа.
+    Курсы могут быть float или Decimal: one задаёт единицу того же типа, normalize (например,
+    округление Decimal до шага хранения) применяется к итоговым курсам перед кешированием.
+    """
+
+    def __init__(self, currencies: Dict[str, Dict[str, Any]], rates: Iterable[Tuple[str, str, Any]],
+                 one: Any = 1.0, normalize: Optional[Callable[[Any], Any]] = None):
+        self.currencies = currencies
+        self.one = one
+        self.normalize = normalize
+        rates = list(rates)
+        self._edges: Dict[str, Dict[str, float]] = {code: {} for code in currencies}
+        for base_code, target_code, rate in rates:
+            self._edges.setdefault(base_code, {})[target_code] = rate
+        # Обратные рёбра не перетирают прямые курсы
+        for base_code, target_code, rate in rates:
+            if rate:
+                self._edges.setdefault(target_code, {}).setdefault(base_code, one / rate)
+        self._paths: Dict[str, Dict[str, float]] = {}
+        self._best: Dict[str, Dict[str, float]] = {}
+
+
+    def path_rates(self, source: str) -> Dict[str, float]:
+        """Курсы от source без normalize: произведения курсов вдоль путей, для дальнейших вычислений."""
+        paths = self._paths.get(source)
+        if paths is None:
+            paths = self._paths[source] = self._search(source)
+        return paths
+
+
+    def best_rates(self, source: str) -> Dict[str, float]:
+        best = self._best.get(source)
+        if best is None:
+            best = self.path_rates(source)
+            if self.normalize is not None:
+                best = {code: self.normalize(rate) for code, rate in best.items()}
+            self._best[source] = best
+        return best
+
+
+    def find_rate(self, from_code: str, to_code: str) -> Optional[float]:
+        if from_code not in self._edges:
+            return None
+        return self.best_rates(from_code).get(to_code)
+
+
+    def _search(self, source: str) -> Dict[str, float]:
+        best = {source: self.one}
+        queue = deque([source])
+        while queue:
+            code = queue.popleft()
+            rate = best[code]
+            for neighbour, edge_rate in self._edges.get(code, {}).items():
+                if neighbour not in best:
+                    best[neighbour] = rate * edge_rate
+                    queue.append(neighbour)
+        return best
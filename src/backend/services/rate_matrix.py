@@ -0,0 +1,39 @@
+from decimal import Decimal
+from typing import Callable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def cross_rates(vector: Sequence[Optional[float]]) -> List[Optional[float]]:
+    """Матрица кросс-курсов построчно: rates[i * n + j] = vector[j] / vector[i].
+
+    vector - курсы одной базовой валюты ко всем валютам матрицы. Строки и столбцы валют,
+    для которых курс к базовой неизвестен (None), заполняются None. С NumPy матрица
+    считается одним внешним делением, без него - тем же делением в списках.
+    """
+    if np is not None:
+        values = np.array([np.nan if value is None or value == 0 else value for value in vector], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = values[np.newaxis, :] / values[:, np.newaxis]
+        return [None if rate != rate else rate for rate in matrix.ravel().tolist()]
+    rates: List[Optional[float]] = []
+    for row_value in vector:
+        if row_value is None or row_value == 0:
+            rates.extend([None] * len(vector))
+        else:
+            rates.extend([None if value is None or value == 0 else value / row_value for value in vector])
+    return rates
+
+
+def cross_rates_exact(vector: Sequence[Optional[Decimal]], quantize: Callable[[Decimal], Decimal]) -> List[Optional[Decimal]]:
+    """То же для Decimal: каждое частное округляется quantize до шага хранения курса."""
+    rates: List[Optional[Decimal]] = []
+    for row_value in vector:
+        if not row_value:
+            rates.extend([None] * len(vector))
+        else:
+            rates.extend([quantize(value / row_value) if value else None for value in vector])
+    return rates
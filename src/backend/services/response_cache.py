@@ -0,0 +1,71 @@
+import hashlib
+import time
+from email.utils import formatdate
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+from src.backend.services import formats
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    body: bytes
+    etag: str
+    last_modified: str
+    media_type: str = formats.JSON
+    encoding: str = formats.IDENTITY
+
+
+class _Entry(NamedTuple):
+    version: int
+    data: Any
+    last_modified: str
+    variants: Dict[Tuple[str, str], CachedResponse]
+
+
+class ResponseCache:
+    """Готовые тела ответов, действительные до следующей записи в БД.
+
+    Запись считается устаревшей, как только меняется версия данных пула соединений. Для каждой
+    версии данные строятся один раз, а каждый вариант (формат и сжатие) кодируется при первом
+    запросе и дальше отдаётся готовыми байтами со своим ETag.
+    """
+
+    def __init__(self, pool, metrics=None):
+        self.pool = pool
+        self.metrics = metrics
+        self._entries: Dict[str, _Entry] = {}
+
+
+    def get(self, key: str, builder: Callable[[], Any], media_type: str = formats.JSON,
+            encoding: str = formats.IDENTITY) -> CachedResponse:
+        version = self.pool.version
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            modified_at = self.pool.modified_at
+            entry = _Entry(version, builder(), formatdate(modified_at, usegmt=True), {})
+            self._entries[key] = entry
+        return self._variant(entry, media_type, encoding)
+
+
+    def _variant(self, entry: _Entry, media_type: str, encoding: str) -> CachedResponse:
+        variant = entry.variants.get((media_type, encoding))
+        if variant is not None:
+            return variant
+        if encoding == formats.IDENTITY:
+            started = time.perf_counter()
+            body = formats.encode(entry.data, media_type)
+            if self.metrics is not None and media_type == formats.JSON:
+                self.metrics.observe_json_encode(time.perf_counter() - started)
+        else:
+            # Сжимается уже закодированное тело: формат кодируется один раз на версию
+            plain = self._variant(entry, media_type, formats.IDENTITY)
+            body, applied = formats.compress(plain.body, encoding)
+            if applied == formats.IDENTITY:
+                # Тело слишком маленькое для сжатия: запрос с этим Accept-Encoding получает несжатый вариант
+                entry.variants[(media_type, encoding)] = plain
+                return plain
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+        variant = CachedResponse(entry.version, body, etag, entry.last_modified, media_type, encoding)
+        # Гонка двух потоков приводит лишь к повторному кодированию одинаковых байтов
+        entry.variants[(media_type, encoding)] = variant
+        return variant
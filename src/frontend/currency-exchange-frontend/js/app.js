@@ -117,6 +117,23 @@ $(document).ready(function() {
 
     requestExchangeRates();
 
+    // receive changed pairs from the server instead of polling the whole list
+    if (window.EventSource) {
+        const rateEvents = new EventSource(`${host}/exchangeRates/stream`);
+        rateEvents.addEventListener("rate", function(event) {
+            const rate = JSON.parse(event.data);
+            const pair = rate.baseCurrency.code + rate.targetCurrency.code;
+            const row = $('.exchange-rates-table tbody tr').filter(function() {
+                return $(this).find('td:first').text() === pair;
+            });
+            if (row.length) {
+                row.find('td:eq(1)').text(rate.rate);
+            } else {
+                requestExchangeRates();
+            }
+        });
+    }
+
     $(document).delegate('.exchange-rate-edit', 'click', function() {
         // Get the currency and exchange rate from the row
         const pair = $(this).closest('tr').find('td:first').text();